@@ -1,3 +1,4 @@
+# Planning chart, not part of the app; needs matplotlib (pip install matplotlib)
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from datetime import datetime, timedelta
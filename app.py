@@ -1,131 +1,31 @@
-import os
+import asyncio
 import gradio as gr
+import os
+import tempfile
 import time
 from datetime import datetime
-from config import ACTIVE_PROVIDER
-from fpdf import FPDF
+from config import BATCH_CONCURRENCY, STRUCTURED_EVALUATION, EVALUATION_CONCURRENCY, PARSE_CONCURRENCY
 from helpers import *
-from markdown_pdf import *
-import fitz
 from blue_theme import BlueTheme
+from database.evaluation_result_db import HISTORY_SORT_COLUMNS
+from batch_evaluation import run_batch
+from pdf_export import pdf_cache, pdf_filename
+from fair_queue import FairQueue
 
 # Load your CSS file
 with open("style.css") as f:
     css = f.read()
 
-provider = get_provider(ACTIVE_PROVIDER)
-
 essay_sample = [["sample_document/sample_essay.pdf"]]
 transcript_sample = [["sample_document/sample_transcript.pdf"]]
 vpd_sample = [["sample_document/sample_vpd.pdf"]]
 
-def extract_raw_text_from_file(file_path):
-    """
-    Extracts text from an essay.
-    """
-    raw_text = ""
-    try:
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                raw_text += page.get_text()
-        
-    except Exception as e:
-        print(f"Error during raw text extraction: {e}")
-    return raw_text
-
-def extract_text_with_model(file_path, file_label):
-    full_text = ""
-
-    if file_label == "essay":
-        prompt = get_prompt_text("prompt_text/essay_parsing_prompt.txt") + get_prompt_text("prompt_text/essay_topics.txt")
-    elif file_label == "transcript":
-        prompt = get_prompt_text("prompt_text/transcript_parsing_prompt.txt")
-    elif file_label == "vpd":
-        prompt = get_prompt_text("prompt_text/vpd_parsing_prompt.txt")
-    else:
-        return
-    
-    file = provider.upload_file_to_model(file_path=file_path)
-    response = generate_response(
-        message=prompt,
-        system_prompt="You are an assistant to extract text from files",
-        contents=[file]
-    )
-    
-    return response
-
-def extract_applicant_name(transcript_content):
-    """
-    Extracts the applicant's name to create a sanitized filename.
-    """
-    prompt = get_prompt_text("prompt_text/extract_applicant_name.txt")
-    try:
-        # Use the existing generate_response helper
-        name_response = generate_response(
-            message=transcript_content,
-            system_prompt=prompt
-        )
-        # Clean the response to get just the name
-        name = name_response.strip().split('\n')[0]
-        # Sanitize for use in a filename
-        sanitized_name = re.sub(r'[^\w\s-]', '', name).strip()
-        sanitized_name = re.sub(r'[-\s]+', '_', sanitized_name)
-        return sanitized_name if sanitized_name else "Unknown_Applicant"
-    except Exception as e:
-        print(f"Could not extract applicant name: {e}")
-        return "Unknown_Applicant"
-
-def generate_pdf(text, output_filename="evaluation.pdf"):
-    """
-    Generates a PDF from markdown text and saves it to a specific path.
-    """
-    output_dir = "evaluations"
-    os.makedirs(output_dir, exist_ok=True)
-    full_path = os.path.join(output_dir, output_filename)
-
-    try:
-        pdf = MarkdownPDF()
-        pdf.render_markdown(text)
-        pdf.output(full_path)
-    except Exception:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        # FPDF requires latin-1, so we encode and replace unknown characters
-        if text is not None:
-            encoded_text = text.encode('latin-1', 'replace').decode('latin-1')
-        else:
-            encoded_text = "" 
-        for line in encoded_text.split('\n'):
-            pdf.multi_cell(0, 10, line)
-        pdf.output(full_path)
-    return full_path
-
-
-def analyze_documents(essay_content, transcript_content, vpd_content=""):
-    instruction_prompt = get_prompt_text("prompt_text/summary_evaluation_prompt.txt")
-
-    final_prompt = f"""
-{instruction_prompt}
---- BEGIN ESSAY ---
-{essay_content}
---- END ESSAY ---
-
---- BEGIN TRANSCRIPT ---
-{transcript_content}
---- END TRANSCRIPT ---
-{
-    "" if vpd_content == "" else
-    "--- BEGIN vpd_german_grade --- " +
-    vpd_content +
-    "--- END vpd_german_grade ---"
-}
-"""
-    return generate_response(
-        final_prompt, 
-        system_prompt="You are an expert Admissions Committee Member for a competitive Master's program that gives score exactly based on provided documents"
-    )
+# Minimum seconds between two partial summary updates while streaming
+STREAM_UPDATE_INTERVAL = 0.2
+# Seconds between two queue position updates while an evaluation waits for a slot
+QUEUE_UPDATE_INTERVAL = 1.0
 
+evaluation_queue = FairQueue(EVALUATION_CONCURRENCY)
 
 # Gradio interface
 with gr.Blocks(
@@ -185,6 +85,8 @@ with gr.Blocks(
                 transcript_content = gr.Textbox(label="Parsed Transcript Content", lines=10)
             with gr.Column(elem_classes=["upload-column"]):
                 vpd_content = gr.Textbox(label="Parsed VPD Content", lines=10)
+        with gr.Row():
+            parse_all_button = gr.Button("Parse All Documents", elem_id="parse-all-button")
         with gr.Row():
             summarize_button = gr.Button("Summarize & Evaluate", elem_classes=["summarize-button"], elem_id="summarize-button")
 
@@ -208,6 +110,7 @@ with gr.Blocks(
         with gr.Row():
             applicant_result_data = gr.JSON(visible=False)
 
+        pdf_request = gr.State(None)
         with gr.Row():
             download_pdf = gr.File(
                 label="Download Evaluation PDF", 
@@ -224,6 +127,14 @@ with gr.Blocks(
 
     with gr.Tab("Evaluation History") as tab_history:
 
+        with gr.Row():
+            history_name = gr.Textbox(label="Applicant Name", placeholder="First letters of the name")
+            history_decision = gr.Dropdown(["All", "ACCEPTED", "REJECTED"], value="All", label="Decision")
+            history_date_from = gr.Textbox(label="From", placeholder="YYYY-MM-DD")
+            history_date_to = gr.Textbox(label="To", placeholder="YYYY-MM-DD")
+            history_sort_by = gr.Dropdown(list(HISTORY_SORT_COLUMNS), value="ID", label="Sort By")
+            history_descending = gr.Checkbox(value=True, label="Descending")
+
         with gr.Row():
             result_table = gr.Dataframe(
                 interactive=False,
@@ -231,10 +142,36 @@ with gr.Blocks(
                 max_height=1000,
                 elem_id="table",
                 wrap=True,
-                type="pandas",
-                show_search='filter'
+                type="pandas"
             )
 
+        with gr.Row():
+            search_box = gr.Textbox(
+                label="Search Evaluations",
+                placeholder='Words or "exact phrase", e.g. "Technical University" statistics',
+                scale=4
+            )
+            search_button = gr.Button("Search", scale=1)
+        search_table = gr.Dataframe(
+            interactive=False,
+            max_height=600,
+            wrap=True,
+            type="pandas",
+            datatype=["number", "str", "str", "str", "markdown"],
+            visible=False
+        )
+
+        history_page = gr.State(1)
+        with gr.Row():
+            previous_page_btn = gr.Button("Previous")
+            history_page_info = gr.Markdown()
+            next_page_btn = gr.Button("Next")
+
+        with gr.Row():
+            export_format = gr.Radio(["ZIP of PDFs", "Merged PDF"], value="ZIP of PDFs", label="Export Format")
+            export_btn = gr.Button("Export Filtered Evaluations")
+        export_file = gr.File(label="Cohort Export", interactive=False, visible=False)
+
         modal_box = gr.Group(visible=False)
 
         with modal_box:
@@ -243,82 +180,262 @@ with gr.Blocks(
                 max_height=600, 
                 container=True
             )
+            history_pdf = gr.File(label="Evaluation PDF", interactive=False, visible=False)
+        selected_result_id = gr.State(None)
         with gr.Row():
+            history_pdf_btn = gr.Button("Download PDF", visible=False)
             close_btn = gr.Button("Close", elem_classes=["close-btn"], visible=False)
 
         def on_select(evt: gr.SelectData, dataframe):
             row_idx, col_idx = evt.index
             try:
-                selected_id = dataframe.iloc[row_idx]["ID"]
-                result = get_result(str(selected_id.item()))
-                if result:
-                    markdown = result[4] 
-                else:
-                    markdown = "Result not found."
-                return gr.update(value=markdown, visible=True), gr.update(visible=True), gr.update(visible=True)
+                selected_id = dataframe.iloc[row_idx]["ID"].item()
+                markdown = get_result_markdown(selected_id)
+                if markdown is None:
+                    return gr.update(value="Result not found.", visible=True), gr.update(visible=True), gr.update(visible=True), gr.update(visible=False), gr.update(visible=False), None
+                return gr.update(value=markdown, visible=True), gr.update(visible=True), gr.update(visible=True), gr.update(visible=True), gr.update(value=None, visible=False), selected_id
+            except Exception as e:
+                print(e)
+                return gr.update(value=f"Error: {e}", visible=True), gr.update(visible=True), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), None
+
+        selection_outputs = [markdown_viewer, modal_box, close_btn, history_pdf_btn, history_pdf, selected_result_id]
+        result_table.select(on_select, inputs=[result_table], outputs=selection_outputs)
+        search_table.select(on_select, inputs=[search_table], outputs=selection_outputs)
+
+        def on_history_pdf(result_id):
+            # Rendered from the stored Markdown, or served from the PDF cache
+            pdf_path = get_result_pdf(result_id) if result_id is not None else None
+            if pdf_path is None:
+                gr.Warning("Result not found.")
+                return gr.update(visible=False)
+            return gr.update(value=pdf_path, visible=True)
+
+        history_pdf_btn.click(on_history_pdf, inputs=[selected_result_id], outputs=[history_pdf])
+
+        def on_search(text):
+            if not text.strip():
+                return gr.update(value=None, visible=False)
+            return gr.update(value=search_evaluations(text), visible=True)
+
+        search_box.submit(on_search, inputs=[search_box], outputs=[search_table])
+        search_button.click(on_search, inputs=[search_box], outputs=[search_table])
+        close_btn.click(
+            lambda: (gr.update(visible=False),) * 5,
+            outputs=[modal_box, markdown_viewer, close_btn, history_pdf_btn, history_pdf]
+        )
+
+        def load_history_page(page, name, decision, date_from, date_to, sort_by, descending):
+            try:
+                df, page, total_pages = get_history_page(
+                    page=page,
+                    sort_by=sort_by,
+                    descending=descending,
+                    name=name.strip(),
+                    decision=None if decision == "All" else decision,
+                    date_from=date_from.strip(),
+                    date_to=date_to.strip()
+                )
+            except ValueError:
+                gr.Warning("Dates must be written as YYYY-MM-DD.")
+                return gr.update(), gr.update(), gr.update()
+            return df, page, f"Page {page} of {total_pages}"
+
+        history_filters = [history_name, history_decision, history_date_from, history_date_to, history_sort_by, history_descending]
+        history_outputs = [result_table, history_page, history_page_info]
+
+        def load_first_page(*filters):
+            return load_history_page(1, *filters)
+
+        for textbox in (history_name, history_date_from, history_date_to):
+            textbox.submit(load_first_page, inputs=history_filters, outputs=history_outputs)
+        for control in (history_decision, history_sort_by, history_descending):
+            control.change(load_first_page, inputs=history_filters, outputs=history_outputs)
+        previous_page_btn.click(
+            lambda page, *filters: load_history_page(page - 1, *filters),
+            inputs=[history_page] + history_filters,
+            outputs=history_outputs
+        )
+        next_page_btn.click(
+            lambda page, *filters: load_history_page(page + 1, *filters),
+            inputs=[history_page] + history_filters,
+            outputs=history_outputs
+        )
+
+        def on_export(name, decision, date_from, date_to, export_kind, progress=gr.Progress()):
+            merged = export_kind == "Merged PDF"
+            timestamp = datetime.now().strftime("%Y-%m-%d_%H%M")
+            output_path = os.path.join(tempfile.mkdtemp(prefix="cohort_export_"), f"Evaluations_{timestamp}.{'pdf' if merged else 'zip'}")
+            try:
+                count = export_cohort(
+                    output_path,
+                    name=name.strip(),
+                    decision=None if decision == "All" else decision,
+                    date_from=date_from.strip(),
+                    date_to=date_to.strip(),
+                    merged=merged,
+                    progress_callback=lambda done, total: progress(done / total, desc=f"Rendered {done}/{total} evaluations")
+                )
+            except ValueError:
+                gr.Warning("Dates must be written as YYYY-MM-DD.")
+                return gr.update(visible=False)
             except Exception as e:
                 print(e)
-                return gr.update(value=f"Error: {e}", visible=True), gr.update(visible=True), gr.update(visible=False)
+                gr.Warning(f"Export failed: {e}")
+                return gr.update(visible=False)
+            if not count:
+                gr.Info("No evaluations match the filters.")
+                return gr.update(visible=False)
+            return gr.update(value=output_path, visible=True)
+
+        export_btn.click(
+            on_export,
+            inputs=[history_name, history_decision, history_date_from, history_date_to, export_format],
+            outputs=[export_file]
+        )
+
+        with gr.Accordion("System Status", open=False):
+            status_json = gr.JSON(label="Evaluation queue, database pool and model routes")
+            status_btn = gr.Button("Refresh")
 
-        result_table.select(on_select, inputs=[result_table], outputs=[markdown_viewer, modal_box, close_btn])
-        close_btn.click(lambda: (gr.update(visible=False), gr.update(visible=False), gr.update(visible=False)), outputs=[modal_box, markdown_viewer, close_btn])
+        def load_status():
+            return {
+                "evaluation_queue": evaluation_queue.metrics(),
+                "database_pool": get_db_metrics(),
+                "model_routes": get_route_metrics()
+            }
 
-    tab_history.select(fn=get_df, outputs=result_table)
+        status_btn.click(load_status, outputs=[status_json])
+
+    tab_history.select(fn=load_first_page, inputs=history_filters, outputs=history_outputs)
+    tab_history.select(fn=load_status, outputs=[status_json])
+
+    with gr.Tab("Batch Evaluation"):
+        gr.Markdown("## Evaluate a ZIP of Applicants", elem_classes="section-title")
+        gr.Markdown("Put each applicant's essay, transcript and optional VPD in their own folder, or name the files like `jane_doe_essay.pdf`.")
+        with gr.Row():
+            batch_file = gr.File(label="Upload ZIP", file_types=['.zip'])
+            with gr.Column():
+                batch_concurrency = gr.Slider(
+                    minimum=1,
+                    maximum=16,
+                    step=1,
+                    value=BATCH_CONCURRENCY,
+                    label="Applicants evaluated at the same time"
+                )
+                batch_resume_id = gr.Number(label="Resume Job ID (optional)", precision=0)
+                batch_button = gr.Button("Run Batch Evaluation")
+        batch_status = gr.Markdown()
+        batch_table = gr.Dataframe(interactive=False, wrap=True, type="pandas")
+
+        def on_run_batch(zip_file, concurrency, resume_job_id, progress=gr.Progress()):
+            if zip_file is None:
+                return "## Please upload a ZIP file first.", None
+            try:
+                job_id = run_batch(
+                    zip_file.name,
+                    concurrency=int(concurrency),
+                    job_id=int(resume_job_id) if resume_job_id else None,
+                    progress_callback=lambda done, total: progress(
+                        done / total if total else 1, desc=f"Evaluated {done}/{total} applicants"
+                    )
+                )
+            except Exception as e:
+                print(e)
+                return f"## Batch evaluation failed: {e}", None
+            job = db.get_batch_job(job_id)
+            return f"**Job {job_id}**: {job[3]}", db.get_batch_dataframe(job_id)
+
+        batch_button.click(
+            fn=on_run_batch,
+            inputs=[batch_file, batch_concurrency, batch_resume_id],
+            outputs=[batch_status, batch_table]
+        )
 
     
-    def process_file(file, file_label):
-        extracted_text = ""
+    async def process_file(file, file_label):
         if file is not None:
-            return extract_text_with_model(file.name, file_label) 
+            return await aextract_text_with_model(file.name, file_label) 
         return ""
 
    
-    def process_essay_and_count(file, file_label):
+    async def process_essay_and_count(file, file_label):
         if file is None:
             return gr.update(value="", label="Parsed Essay Content")
-        raw_text = extract_raw_text_from_file(file.name)
-        word_count = len(raw_text.split())
-        new_label = f"Parsed Essay Content (Word Count: {word_count})"
-        parsed_text = extract_text_with_model(file.name, "essay")
-        return gr.update(value=parsed_text, label=new_label)
+        parsed = await aparse_documents(essay_path=file.name)
+        new_label = f"Parsed Essay Content (Word Count: {parsed['essay_word_count']})"
+        return gr.update(value=parsed["essay"], label=new_label)
+
+    async def process_all_files(essay, transcript, vpd):
+        parsed = await aparse_documents(
+            essay_path=essay.name if essay is not None else None,
+            transcript_path=transcript.name if transcript is not None else None,
+            vpd_path=vpd.name if vpd is not None else None
+        )
+        essay_label = "Parsed Essay Content"
+        if essay is not None:
+            essay_label = f"Parsed Essay Content (Word Count: {parsed['essay_word_count']})"
+        return (
+            gr.update(value=parsed["essay"], label=essay_label),
+            parsed["transcript"],
+            parsed["vpd"]
+        )
     
 
     essay_file.upload(
         fn=process_essay_and_count, 
         inputs= [essay_file, gr.State("essay")], 
+        concurrency_id="parse",
+        concurrency_limit=PARSE_CONCURRENCY,
         outputs=essay_content
     )
     transcript_file.upload(
         fn=process_file, 
         inputs= [transcript_file, gr.State("transcript")], 
+        concurrency_id="parse",
+        concurrency_limit=PARSE_CONCURRENCY,
         outputs=transcript_content
     )
     vpd_file.upload(
         fn=process_file, 
         inputs= [vpd_file, gr.State("vpd")], 
+        concurrency_id="parse",
+        concurrency_limit=PARSE_CONCURRENCY,
         outputs=vpd_content
     )
 
+    parse_all_button.click(
+        fn=process_all_files,
+        inputs=[essay_file, transcript_file, vpd_file],
+        outputs=[essay_content, transcript_content, vpd_content],
+        concurrency_id="parse",
+        concurrency_limit=PARSE_CONCURRENCY
+    )
+
     essay_example.change(
         fn=process_essay_and_count,
         inputs=[essay_example, gr.State("essay")],
-        outputs=essay_content
+        outputs=essay_content,
+        concurrency_id="parse",
+        concurrency_limit=PARSE_CONCURRENCY
     )
 
     transcript_example.change(
         fn=process_file,
         inputs=[transcript_example, gr.State("transcript")],
-        outputs=transcript_content
+        outputs=transcript_content,
+        concurrency_id="parse",
+        concurrency_limit=PARSE_CONCURRENCY
     )
 
-    def on_summarize(essay_text, transcript_text, vpd_text=""):
+    async def evaluate_applicant(essay_text, transcript_text, vpd_text=""):
         # Step 1: Start - hide button, show progress bar
         yield (
             gr.update(visible=False),  # output_summary
             gr.update(visible=True, value=10),  # progress_bar
             gr.update(visible=False),  # hide summarize_button
             gr.update(visible=False), #download_pdf
-            gr.update(visible=False)
+            gr.update(visible=False),
+            None  # pdf_request
         )
 
         # Step 2: Input validation
@@ -331,68 +448,152 @@ with gr.Blocks(
                 gr.update(visible=False),
                 gr.update(visible=True),
                 gr.update(visible=False), #download_pdf
-                gr.update(visible=False)
+                gr.update(visible=False),
+                None
             )
             return
 
-        # Step 3: LLM document analysis
-        summary_text = analyze_documents(essay_text, transcript_text, vpd_text)
-        yield (
-            gr.update(visible=False),
-            gr.update(value=60), 
-            gr.update(visible=False), 
-            gr.update(visible=False), #download_pdf
-            gr.update(visible=False)
-        )
+        # Step 3: LLM document analysis, shown as it is generated
+        if STRUCTURED_EVALUATION:
+            stream = aanalyze_documents_structured_stream(essay_text, transcript_text, vpd_text)
+        else:
+            stream = aanalyze_documents_stream(essay_text, transcript_text, vpd_text)
+        raw_output = ""
+        last_update = 0
+        try:
+            async for chunk in stream:
+                raw_output += chunk
+                if time.monotonic() - last_update >= STREAM_UPDATE_INTERVAL:
+                    last_update = time.monotonic()
+                    partial_summary = extract_partial_json_string(raw_output, "markdown") if STRUCTURED_EVALUATION else raw_output
+                    yield (
+                        gr.update(value=partial_summary, visible=True),
+                        gr.update(value=30), 
+                        gr.update(visible=False), 
+                        gr.update(visible=False), #download_pdf
+                        gr.update(visible=False),
+                        None
+                    )
+        except Exception as e:
+            print(e)
+            # Nothing is saved when the model call fails
+            yield (
+                gr.update(value=f"## Evaluation failed: {e}", visible=True),
+                gr.update(visible=False),
+                gr.update(visible=True),
+                gr.update(visible=False), #download_pdf
+                gr.update(visible=False),
+                None
+            )
+            return
 
-        # Step 4: Extract name
-        applicant_name = extract_applicant_name(transcript_text)
-        yield (
-            gr.update(visible=False),
-            gr.update(value=75), 
-            gr.update(visible=False), 
-            gr.update(visible=False), #download_pdf
-            gr.update(visible=False)
-        )
+        # Step 4: Extract name and decision, from the structured output when available
+        if STRUCTURED_EVALUATION:
+            summary_text, applicant_name, decision = await asyncio.to_thread(
+                resolve_structured_evaluation, raw_output, transcript_text
+            )
+            yield (
+                gr.update(value=summary_text, visible=True),
+                gr.update(value=75), 
+                gr.update(visible=False), 
+                gr.update(visible=False), #download_pdf
+                gr.update(visible=False),
+                None
+            )
+        else:
+            summary_text = raw_output
+            yield (
+                gr.update(value=summary_text, visible=True),
+                gr.update(value=60), 
+                gr.update(visible=False), 
+                gr.update(visible=False), #download_pdf
+                gr.update(visible=False),
+                None
+            )
+            applicant_name = await asyncio.to_thread(extract_applicant_name, transcript_text)
+            decision = await asyncio.to_thread(get_decision, summary_text[len(summary_text) * 3 // 5:])
+            yield (
+                gr.update(),
+                gr.update(value=75), 
+                gr.update(visible=False), 
+                gr.update(visible=False), #download_pdf
+                gr.update(visible=False),
+                None
+            )
 
-        # Step 5: Generate PDF
+        # Step 5: Save, and queue the PDF so it renders while the result is read
         timestamp = datetime.now().strftime("%Y-%m-%d_%H%M")
-        filename = f"{applicant_name}_Evaluation_{timestamp}.pdf"
-        pdf_path = generate_pdf(summary_text, filename)
-
-        yield (
-            gr.update(visible=False),
-            gr.update(value=90), 
-            gr.update(visible=False), 
-            gr.update(visible=False), #download_pdf
-            gr.update(visible=False)
-        )
-
         data['applicant_name'] = applicant_name
         data['created_at'] = timestamp
-        data['decision'] = get_decision(summary_text[len(summary_text) * 3 // 5:])
+        data['decision'] = decision
+
+        await asyncio.to_thread(save_evaluation, data, summary_text)
 
-        save_evaluation(data, summary_text)
-        
-        download_label = f"Download Evaluation"
+        pdf_request = (summary_text, pdf_filename(applicant_name, timestamp))
+        pdf_cache.submit(*pdf_request)
         yield (
             gr.update(value=summary_text, visible=True),
             gr.update(visible=False), 
             gr.update(visible=False), 
-            gr.update(value=pdf_path, visible=True, interactive=True, label=download_label), #download_pdf
-            gr.update(visible=True)
+            gr.update(visible=False), #download_pdf
+            gr.update(visible=True),
+            pdf_request
         )
 
+    async def on_summarize(essay_text, transcript_text, vpd_text="", request: gr.Request = None):
+        if not essay_text.strip() or not transcript_text.strip():
+            async for update in evaluate_applicant(essay_text, transcript_text, vpd_text):
+                yield update
+            return
+        # Reviewers take turns for the evaluation slots instead of queueing first come, first served
+        user = (request.username or request.session_hash) if request is not None else None
+        ticket = evaluation_queue.enter(user)
+        try:
+            while not await ticket.wait(QUEUE_UPDATE_INTERVAL):
+                position = ticket.position()
+                waiting_txt = f"### Waiting for a free slot: {position} evaluation(s) ahead of yours" if position else "### Your evaluation starts as soon as a slot is free"
+                yield (
+                    gr.update(value=waiting_txt, visible=True),
+                    gr.update(visible=True, value=5),
+                    gr.update(visible=False),
+                    gr.update(visible=False), #download_pdf
+                    gr.update(visible=False),
+                    None
+                )
+            async for update in evaluate_applicant(essay_text, transcript_text, vpd_text):
+                yield update
+        finally:
+            ticket.release()
+
+    async def on_pdf_ready(pdf_request):
+        if not pdf_request:
+            return gr.update(visible=False)
+        try:
+            pdf_path = await asyncio.wrap_future(pdf_cache.submit(*pdf_request))
+        except Exception as e:
+            print(e)
+            return gr.update(visible=False)
+        return gr.update(value=pdf_path, visible=True, interactive=True, label="Download Evaluation")
+
     summarize_button.click(
         fn=on_summarize,
         inputs=[essay_content, transcript_content, vpd_content],
-        outputs=[output, progress_bar, summarize_button, download_pdf, caution_markdown],
-        concurrency_limit=1,
+        outputs=[output, progress_bar, summarize_button, download_pdf, caution_markdown, pdf_request],
+        # evaluation_queue limits the evaluations; the provider limits protect the model API
+        concurrency_limit=None,
         queue=True,
         show_progress=False
+    ).then(
+        # Only waits for the background render, so it needs no slot of its own
+        fn=on_pdf_ready,
+        inputs=[pdf_request],
+        outputs=[download_pdf],
+        concurrency_limit=None,
+        show_progress=False
     )
 
 if __name__ == "__main__":
+    start_uploaded_file_sweeper()
     student_application_evaluator.launch(
         favicon_path="img/tum_logo.png",
         show_api=False,
@@ -0,0 +1,385 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+from config import BATCH_CONCURRENCY, BATCH_RATE_PER_MINUTE, BATCH_POLL_SECONDS, STRUCTURED_EVALUATION
+from helpers import (
+    db, providers, get_provider, get_task_route, get_prompt_version, parse_documents, analyze_documents, analyze_documents_structured,
+    build_evaluation_request, resolve_structured_evaluation, extract_applicant_name, parse_applicant_name, sanitize_applicant_name,
+    get_decision, parse_decision, parse_structured_evaluation, extract_partial_json_string, save_evaluation, sweep_uploaded_files,
+    EVALUATION_SYSTEM_PROMPT, EVALUATION_SCHEMA
+)
+
+DOCUMENT_LABELS = ("essay", "transcript", "vpd")
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".webp")
+
+class RateLimiter:
+    """
+    Spaces out calls to acquire() so that at most rate_per_minute of them
+    start in any minute. A rate of 0 disables the limit.
+    """
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+def find_applicant_bundles(root_dir):
+    """
+    Groups the documents under root_dir per applicant.
+
+    A folder holding at most one essay, transcript and VPD is one applicant
+    (e.g. jane_doe/essay.pdf). Otherwise files are grouped by the name left
+    after removing the document type (e.g. jane_doe_essay.pdf).
+    """
+    bundles = {}
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(('.', '__')))
+        labeled = []
+        for filename in sorted(filenames):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in SUPPORTED_EXTENSIONS or filename.startswith('.'):
+                continue
+            lowered = stem.lower()
+            label = next((l for l in DOCUMENT_LABELS if l in lowered), None)
+            if label is None:
+                continue
+            prefix = lowered.replace(label, "").strip(" _-.")
+            labeled.append((label, prefix, os.path.join(dirpath, filename)))
+
+        rel_dir = os.path.relpath(dirpath, root_dir)
+        labels = [label for label, _, _ in labeled]
+        one_per_folder = rel_dir != "." and len(labels) == len(set(labels))
+        for label, prefix, path in labeled:
+            if one_per_folder:
+                key = rel_dir
+            elif rel_dir == ".":
+                key = prefix or "applicant"
+            else:
+                key = os.path.join(rel_dir, prefix)
+            bundle = bundles.setdefault(key, {})
+            if label in bundle:
+                print(f"Skipping duplicate {label} for {key}: {path}")
+                continue
+            bundle[label] = path
+    return bundles
+
+def parse_bundle(files):
+    """
+    Parses one applicant's documents, raising ValueError when the essay or
+    transcript is missing or could not be parsed.
+    """
+    if not files.get("essay") or not files.get("transcript"):
+        raise ValueError("Both an essay and a transcript are required")
+
+    parsed = parse_documents(
+        essay_path=files.get("essay"),
+        transcript_path=files.get("transcript"),
+        vpd_path=files.get("vpd")
+    )
+    if not parsed["essay"].strip() or not parsed["transcript"].strip():
+        raise ValueError("Essay or transcript could not be parsed")
+    return parsed
+
+def evaluate_bundle(files):
+    """
+    Runs one applicant through parsing, evaluation, name and decision extraction
+    and stores the result. Returns the ID of the stored evaluation.
+    """
+    parsed = parse_bundle(files)
+    if STRUCTURED_EVALUATION:
+        raw_output = analyze_documents_structured(parsed["essay"], parsed["transcript"], parsed["vpd"])
+        summary_text, applicant_name, decision = resolve_structured_evaluation(raw_output, parsed["transcript"])
+    else:
+        summary_text = analyze_documents(parsed["essay"], parsed["transcript"], parsed["vpd"])
+        applicant_name = extract_applicant_name(parsed["transcript"])
+        decision = get_decision(summary_text[len(summary_text) * 3 // 5:])
+    data = {
+        'applicant_name': applicant_name,
+        'created_at': datetime.now().strftime("%Y-%m-%d_%H%M"),
+        'decision': decision
+    }
+    return save_evaluation(data, summary_text)
+
+@contextmanager
+def open_batch_source(source):
+    """
+    Yields a directory with the applicant documents, extracting ZIP files to a temporary folder.
+    """
+    if zipfile.is_zipfile(source):
+        with tempfile.TemporaryDirectory() as extract_dir:
+            with zipfile.ZipFile(source) as archive:
+                archive.extractall(extract_dir)
+            yield extract_dir
+    elif os.path.isdir(source):
+        yield source
+    else:
+        raise ValueError(f"Batch source must be a directory or ZIP file: {source}")
+
+def _start_job(source, bundles, job_id):
+    if job_id is None:
+        job_id = db.create_batch_job(os.path.abspath(source), len(bundles))
+    else:
+        if db.get_batch_job(job_id) is None:
+            raise ValueError(f"Batch job {job_id} does not exist")
+        db.update_batch_job(job_id, "running", total=len(bundles))
+
+    statuses = db.get_batch_item_statuses(job_id)
+    # Submitted applicants are owned by a provider batch and are stored by collect_provider_batches
+    pending = [key for key in sorted(bundles) if statuses.get(key) not in ("done", "submitted")]
+    for key in pending:
+        db.set_batch_item(job_id, key, "pending")
+    return job_id, pending
+
+def _finish_job(job_id):
+    statuses = db.get_batch_item_statuses(job_id).values()
+    if any(status in ("pending", "running", "submitted") for status in statuses):
+        return
+    db.update_batch_job(job_id, "completed" if all(status == "done" for status in statuses) else "completed_with_errors")
+
+def run_batch(
+    source,
+    concurrency=BATCH_CONCURRENCY,
+    rate_per_minute=BATCH_RATE_PER_MINUTE,
+    job_id=None,
+    progress_callback=None
+):
+    """
+    Evaluates every applicant in a directory or ZIP file and returns the batch job ID.
+
+    Progress is stored per applicant, so passing the job_id of an interrupted run
+    skips the applicants that were already evaluated.
+    """
+    with open_batch_source(source) as root_dir:
+        bundles = find_applicant_bundles(root_dir)
+        job_id, pending = _start_job(source, bundles, job_id)
+
+        total = len(bundles)
+        completed = total - len(pending)
+        limiter = RateLimiter(rate_per_minute)
+
+        def worker(key):
+            limiter.acquire()
+            db.set_batch_item(job_id, key, "running")
+            return evaluate_bundle(bundles[key])
+
+        if progress_callback:
+            progress_callback(completed, total)
+        with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as executor:
+            futures = {executor.submit(worker, key): key for key in pending}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    db.set_batch_item(job_id, key, "done", result_id=future.result())
+                except Exception as e:
+                    print(f"Batch evaluation failed for {key}: {e}")
+                    db.set_batch_item(job_id, key, "failed", error=str(e))
+                completed += 1
+                if progress_callback:
+                    progress_callback(completed, total)
+
+    _finish_job(job_id)
+    return job_id
+
+def submit_provider_batch(source, concurrency=BATCH_CONCURRENCY, job_id=None):
+    """
+    Parses every applicant and submits one structured evaluation per applicant,
+    which also holds the name and decision, to the provider's batch endpoint.
+    Returns the batch job ID; the results are stored later by collect_provider_batches.
+    """
+    with open_batch_source(source) as root_dir:
+        bundles = find_applicant_bundles(root_dir)
+        job_id, pending = _start_job(source, bundles, job_id)
+
+        parsed = {}
+        with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as executor:
+            futures = {executor.submit(parse_bundle, bundles[key]): key for key in pending}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    parsed[key] = future.result()
+                except Exception as e:
+                    print(f"Batch parsing failed for {key}: {e}")
+                    db.set_batch_item(job_id, key, "failed", error=str(e))
+
+    if not parsed:
+        _finish_job(job_id)
+        return job_id
+
+    prompt_version = get_prompt_version()
+    provider_name, model = get_task_route("evaluate")
+    requests = []
+    tracked_requests = []
+    for index, key in enumerate(sorted(parsed)):
+        documents = parsed[key]
+        # The structured evaluation carries the name and decision, so collecting needs no further model calls
+        evaluation = build_evaluation_request(documents["essay"], documents["transcript"], documents["vpd"], structured=True)
+        custom_id = f"applicant-{index}-evaluation"
+        requests.append({
+            "custom_id": custom_id,
+            "prompt": evaluation["message"],
+            "system_prompt": EVALUATION_SYSTEM_PROMPT,
+            "instructions": evaluation["instructions"],
+            "temperature": 0.5,
+            "max_tokens": evaluation["max_tokens"],
+            "response_schema": EVALUATION_SCHEMA
+        })
+        tracked_requests.append({
+            "custom_id": custom_id,
+            "applicant_key": key,
+            "kind": "evaluation",
+            "prompt_version": prompt_version,
+            "applicant_name": parse_applicant_name(documents["transcript"])
+        })
+
+    provider_batch_id = providers[provider_name].submit_batch(model, requests)
+    db.add_provider_batch(job_id, provider_name, provider_batch_id, model, tracked_requests)
+    for key in parsed:
+        db.set_batch_item(job_id, key, "submitted")
+    return job_id
+
+def resolve_batch_evaluation(outputs, transcript_name):
+    """
+    Returns (summary_text, applicant_name, decision) from an applicant's batch
+    outputs without calling the model, or None when they hold no evaluation with
+    a clear decision. transcript_name is the name read from the parsed transcript.
+    """
+    raw_output = outputs.get("evaluation")
+    if not raw_output:
+        return None
+    evaluation = parse_structured_evaluation(raw_output)
+    if evaluation:
+        applicant_name = evaluation["applicant_name"]
+        if applicant_name == "Unknown_Applicant":
+            applicant_name = transcript_name or applicant_name
+        return evaluation["markdown"], applicant_name, evaluation["decision"]
+
+    # Batches submitted before evaluations were structured have plain Markdown and a separate name answer
+    summary_text = extract_partial_json_string(raw_output, "markdown") or raw_output
+    decision = parse_decision(summary_text[len(summary_text) * 3 // 5:])
+    if decision is None:
+        return None
+    applicant_name = transcript_name or sanitize_applicant_name(outputs.get("name"))
+    return summary_text, applicant_name, decision
+
+def _collect_provider_batch(row_id, job_id, provider_name, provider_batch_id, requests):
+    """
+    Polls one provider batch and stores its evaluations once it has finished.
+    Returns whether it is still running.
+    """
+    batch_provider = providers.get(provider_name) or get_provider(provider_name)
+    status = batch_provider.get_batch_status(provider_batch_id)
+    if status == "running":
+        return True
+
+    applicant_keys = sorted({request["applicant_key"] for request in requests})
+    if status == "failed":
+        for key in applicant_keys:
+            db.set_batch_item(job_id, key, "failed", error=f"Provider batch {provider_batch_id} failed")
+        db.update_provider_batch(row_id, "failed")
+        _finish_job(job_id)
+        return False
+
+    results = batch_provider.get_batch_results(provider_batch_id, [request["custom_id"] for request in requests])
+    outputs = {key: {} for key in applicant_keys}
+    prompt_versions = {}
+    applicant_names = {}
+    for request in requests:
+        outputs[request["applicant_key"]][request["kind"]] = results.get(request["custom_id"])
+        prompt_versions[request["applicant_key"]] = request.get("prompt_version")
+        applicant_names[request["applicant_key"]] = request.get("applicant_name")
+
+    items = []
+    missing = []
+    for key in applicant_keys:
+        resolved = resolve_batch_evaluation(outputs[key], applicant_names.get(key))
+        if resolved is None:
+            missing.append(key)
+            continue
+        summary_text, applicant_name, decision = resolved
+        items.append((key, (
+            applicant_name,
+            summary_text,
+            datetime.now().strftime("%Y-%m-%d_%H%M"),
+            decision,
+            prompt_versions.get(key) or get_prompt_version()
+        )))
+
+    for key in missing:
+        db.set_batch_item(job_id, key, "failed", error="No evaluation with a decision returned by the provider batch")
+    # The results, their items and the batch status are written together, so a
+    # batch that fails halfway stays running and is collected again in full
+    db.complete_provider_batch(row_id, job_id, items)
+    _finish_job(job_id)
+    return False
+
+def collect_provider_batches():
+    """
+    Polls every submitted provider batch once and stores the evaluations of the
+    finished ones. A batch that can't be collected is reported and left running,
+    so the next call tries it again. Returns the number of batches still running.
+    """
+    still_running = 0
+    for row_id, job_id, provider_name, provider_batch_id, model, requests in db.get_running_provider_batches():
+        try:
+            if _collect_provider_batch(row_id, job_id, provider_name, provider_batch_id, requests):
+                still_running += 1
+        except Exception as e:
+            print(f"Error collecting provider batch {provider_batch_id}: {e}")
+            still_running += 1
+    return still_running
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a folder or ZIP of applicant documents.")
+    parser.add_argument("source", nargs="?", help="Directory or ZIP file with one folder (or file prefix) per applicant")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Applicants evaluated at the same time")
+    parser.add_argument("--rate", type=float, default=BATCH_RATE_PER_MINUTE, help="Maximum applicants started per minute (0 for no limit)")
+    parser.add_argument("--resume", type=int, default=None, metavar="JOB_ID", help="Continue an earlier batch job")
+    parser.add_argument("--provider-batch", action="store_true", help="Submit the evaluations to the provider's batch endpoint instead of calling it per applicant")
+    parser.add_argument("--collect", action="store_true", help="Store the results of finished provider batches")
+    parser.add_argument("--wait", action="store_true", help="With --collect, keep polling until every provider batch has finished")
+    args = parser.parse_args()
+
+    sweep_uploaded_files()
+    if args.collect:
+        while True:
+            still_running = collect_provider_batches()
+            print(f"{still_running} provider batches still running")
+            if not args.wait or still_running == 0:
+                return
+            time.sleep(BATCH_POLL_SECONDS)
+
+    if not args.source:
+        parser.error("source is required unless --collect is given")
+
+    if args.provider_batch:
+        job_id = submit_provider_batch(args.source, concurrency=args.concurrency, job_id=args.resume)
+        print(f"Batch job {job_id} submitted, run with --collect to store the results")
+        return
+
+    job_id = run_batch(
+        args.source,
+        concurrency=args.concurrency,
+        rate_per_minute=args.rate,
+        job_id=args.resume,
+        progress_callback=lambda done, total: print(f"Evaluated {done}/{total} applicants")
+    )
+    print(f"Batch job {job_id} finished")
+    print(db.get_batch_dataframe(job_id).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -11,3 +11,77 @@ API_KEYS = {
 }
 
 MODEL_TO_USE = os.getenv("MODEL_TO_USE")
+
+PARSE_CACHE_DB_PATH = os.getenv("PARSE_CACHE_DB_PATH", "parse_cache.db")
+PARSE_CACHE_MAX_MB = int(os.getenv("PARSE_CACHE_MAX_MB", "200"))
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "4"))
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_RATE_PER_MINUTE = float(os.getenv("BATCH_RATE_PER_MINUTE", "0"))
+BATCH_POLL_SECONDS = int(os.getenv("BATCH_POLL_SECONDS", "60"))
+
+# Ask for name, decision and scores in the evaluation call itself instead of two follow-up calls
+STRUCTURED_EVALUATION = os.getenv("STRUCTURED_EVALUATION", "true").lower() == "true"
+
+# Parse PDFs with a usable text layer from their text instead of uploading the file
+TEXT_LAYER_FAST_PATH = os.getenv("TEXT_LAYER_FAST_PATH", "true").lower() == "true"
+TEXT_LAYER_MIN_CHARS_PER_PAGE = int(os.getenv("TEXT_LAYER_MIN_CHARS_PER_PAGE", "100"))
+TEXT_LAYER_MIN_GLYPH_RATIO = float(os.getenv("TEXT_LAYER_MIN_GLYPH_RATIO", "0.95"))
+
+# Local OCR for images and scanned PDFs before falling back to uploading them ("tesseract" or "none")
+OCR_ENGINE = os.getenv("OCR_ENGINE", "none").lower()
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng+deu")
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 2)))
+
+# Uploaded provider files are reused until they expire; files without a provider expiry are kept this long
+UPLOADED_FILE_RETENTION_HOURS = float(os.getenv("UPLOADED_FILE_RETENTION_HOURS", "24"))
+UPLOADED_FILE_SWEEP_MINUTES = float(os.getenv("UPLOADED_FILE_SWEEP_MINUTES", "30"))
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+
+# Prompt files are read from PROMPT_DIR; files in PROMPT_DIR/PROMPT_SET override them
+PROMPT_DIR = os.getenv("PROMPT_DIR", "prompt_text")
+PROMPT_SET = os.getenv("PROMPT_SET", "")
+
+# How long Gemini keeps a context cache of the static prompt instructions, 0 to disable it
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+
+# Token budget of one evaluation request; longer documents are shortened to fit
+EVALUATION_INPUT_TOKEN_BUDGET = int(os.getenv("EVALUATION_INPUT_TOKEN_BUDGET", "30000"))
+MAX_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", "6000"))
+# 0 looks the context window up from the evaluate task's models
+MODEL_CONTEXT_WINDOW = int(os.getenv("MODEL_CONTEXT_WINDOW", "0"))
+
+# Shared limits for every call to the model provider; 0 turns a rate limit off
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+
+# A second provider and model that takes over when the active one fails or is slow
+FALLBACK_PROVIDER = os.getenv("FALLBACK_PROVIDER", "")
+FALLBACK_MODEL = os.getenv("FALLBACK_MODEL", "")
+# Tasks (parse_essay, parse_transcript, parse_vpd, evaluate, name, decision; parse for all three
+# parse_* tasks) whose slow calls are hedged on the fallback route
+HEDGED_TASKS = [task.strip() for task in os.getenv("HEDGED_TASKS", "").split(",") if task.strip()]
+
+# Model per task as "model" (on ACTIVE_PROVIDER) or "provider:model", e.g. MODEL_DECISION=gpt-4.1-mini.
+# Tasks without one use MODEL_TO_USE.
+TASK_MODELS = {
+    task: os.getenv(f"MODEL_{task.upper()}", "")
+    for task in ("parse_essay", "parse_transcript", "parse_vpd", "evaluate", "name", "decision")
+}
+
+# Evaluation PDFs are rendered in the background into PDF_CACHE_DIR, keyed by the Markdown they show.
+# The least recently used ones are deleted once the folder grows past PDF_CACHE_MAX_MB.
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "evaluations")
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", "200"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "1"))
+# Processes rendering PDFs for a cohort export, 0 for one per CPU core
+PDF_EXPORT_WORKERS = int(os.getenv("PDF_EXPORT_WORKERS", "0"))
+
+# Requests from the web UI handled at the same time; evaluations are shared fairly between reviewers
+EVALUATION_CONCURRENCY = int(os.getenv("EVALUATION_CONCURRENCY", "8"))
+PARSE_CONCURRENCY = int(os.getenv("PARSE_CONCURRENCY", "4"))
@@ -0,0 +1,107 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+class SQLiteConnectionPool:
+    """
+    Thread-safe pool of SQLite connections in WAL mode, so readers don't block
+    behind writers and connections are not reopened for every query.
+
+    connection() is used like sqlite3's connection context manager: the
+    transaction is committed on success and rolled back on error.
+    """
+    def __init__(self, db_path, max_connections=8, timeout=30.0):
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._metrics = {
+            "acquisitions": 0,
+            "waits": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "lock_errors": 0,
+        }
+
+    def _create_connection(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-16000')
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait(), 0.0
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.max_connections:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._create_connection(), 0.0
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        start = time.monotonic()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No free connection to {self.db_path} after {self.timeout} seconds")
+        return conn, time.monotonic() - start
+
+    @contextmanager
+    def connection(self):
+        conn, waited = self._acquire()
+        with self._lock:
+            self._metrics["acquisitions"] += 1
+            if waited:
+                self._metrics["waits"] += 1
+                self._metrics["total_wait_seconds"] += waited
+                self._metrics["max_wait_seconds"] = max(self._metrics["max_wait_seconds"], waited)
+        try:
+            yield conn
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            if "locked" in str(e):
+                with self._lock:
+                    self._metrics["lock_errors"] += 1
+            raise
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["open_connections"] = self._created
+        metrics["idle_connections"] = self._idle.qsize()
+        return metrics
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
@@ -1,13 +1,89 @@
+import json
+import re
 import sqlite3
-import pandas as pd
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING
+from .connection_pool import SQLiteConnectionPool
+
+if TYPE_CHECKING:
+    # pandas is only imported by the methods that build DataFrames
+    import pandas as pd
+
+HISTORY_COLUMNS = ["ID", "Applicant Name", "Created At", "Decision"]
+
+# Maps the history table's column names to the columns that can be sorted on
+HISTORY_SORT_COLUMNS = {
+    "ID": "id",
+    "Applicant Name": "name COLLATE NOCASE",
+    "Created At": "created_at",
+    "Decision": "decision",
+}
+
+SEARCH_COLUMNS = HISTORY_COLUMNS + ["Match"]
+
+def build_search_query(text):
+    """
+    Turns a reviewer's search text into an FTS5 query. Words are matched as terms
+    and "quoted text" as a phrase, so punctuation can't break the query syntax.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', text or ""):
+        term = (phrase or word).replace('"', '')
+        if term.strip():
+            terms.append(f'"{term}"')
+    return " ".join(terms)
+
+def build_filter_clause(name=None, decision=None, created_from=None, created_before=None):
+    """
+    Returns the WHERE clause and parameters for the history filters. name matches
+    the start of the applicant name, ignoring case. created_from is inclusive and
+    created_before is exclusive; both are compared with the stored created_at strings.
+    """
+    conditions = []
+    params = []
+    if name:
+        # A prefix match can use the NOCASE name index; stored names have underscores for spaces
+        prefix = re.sub(r'\s+', '_', name.strip())
+        conditions.append("name LIKE ? ESCAPE '\\'")
+        params.append(re.sub(r'([\\%_])', r'\\\1', prefix) + '%')
+    if decision:
+        conditions.append("decision = ?")
+        params.append(decision)
+    if created_from:
+        conditions.append("created_at >= ?")
+        params.append(created_from)
+    if created_before:
+        conditions.append("created_at < ?")
+        params.append(created_before)
+    return (f" WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+def compress_markdown(markdown):
+    return zlib.compress(markdown.encode('utf-8'), 6)
+
+def decompress_markdown(body):
+    return zlib.decompress(body).decode('utf-8')
 
 class EvaluationResultDB:
-    def __init__(self, db_path='evaluation_results.db'):
+    """
+    Evaluation rows hold only the columns the history table lists. The Markdown
+    bodies live zlib-compressed in evaluation_bodies and are loaded one at a time
+    through a small LRU when a result is opened.
+    """
+    def __init__(self, db_path='evaluation_results.db', markdown_cache_size=32):
         self.db_path = db_path
+        self._pool = SQLiteConnectionPool(db_path)
+        self.search_enabled = False
+        self._markdown_cache = OrderedDict()
+        self._markdown_cache_size = markdown_cache_size
+        self._markdown_cache_lock = threading.Lock()
         self._create_table()
+        self._create_search_index()
 
     def _connect(self):
-        return sqlite3.connect(self.db_path)
+        return self._pool.connection()
 
     def _create_table(self):
         with self._connect() as conn:
@@ -15,38 +91,203 @@ class EvaluationResultDB:
                 CREATE TABLE IF NOT EXISTS evaluation_results (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     name TEXT NOT NULL,
-                    markdown TEXT NOT NULL,
                     created_at TEXT,
-                    decision TEXT
+                    decision TEXT,
+                    prompt_version TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS evaluation_bodies (
+                    result_id INTEGER PRIMARY KEY,
+                    body BLOB NOT NULL
+                )
+            ''')
+            self._migrate_inline_markdown(conn)
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(evaluation_results)')]
+            if 'prompt_version' not in columns:
+                conn.execute('ALTER TABLE evaluation_results ADD COLUMN prompt_version TEXT')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_evaluation_results_created_at ON evaluation_results (created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_evaluation_results_decision ON evaluation_results (decision)')
+            # LIKE is case-insensitive, so only a NOCASE index serves the name filter
+            conn.execute('DROP INDEX IF EXISTS idx_evaluation_results_name')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_evaluation_results_name_nocase ON evaluation_results (name COLLATE NOCASE)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TEXT,
+                    updated_at TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS batch_items (
+                    job_id INTEGER NOT NULL,
+                    applicant_key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result_id INTEGER,
+                    error TEXT,
+                    updated_at TEXT,
+                    PRIMARY KEY (job_id, applicant_key)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS provider_batches (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id INTEGER NOT NULL,
+                    provider TEXT NOT NULL,
+                    provider_batch_id TEXT NOT NULL,
+                    model TEXT,
+                    requests TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TEXT,
+                    updated_at TEXT
                 )
             ''')
 
-    def add_result(self, name, markdown, created_at, decision):
-        with self._connect() as conn:
-            conn.execute(
-                'INSERT INTO evaluation_results (name, markdown, created_at, decision) VALUES (?, ?, ?, ?)',
-                (name, markdown, created_at, decision)
+    def _migrate_inline_markdown(self, conn):
+        """
+        Databases created before the bodies were split out keep the Markdown in
+        evaluation_results.markdown. Moves it into evaluation_bodies and rebuilds
+        the table without that column.
+        """
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(evaluation_results)')]
+        if 'markdown' not in columns:
+            return
+        print("Moving evaluation bodies into compressed storage...")
+        cur = conn.execute('SELECT id, markdown FROM evaluation_results')
+        conn.executemany(
+            'INSERT OR REPLACE INTO evaluation_bodies (result_id, body) VALUES (?, ?)',
+            ((result_id, compress_markdown(markdown or "")) for result_id, markdown in cur.fetchall())
+        )
+        conn.execute('''
+            CREATE TABLE evaluation_results_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                created_at TEXT,
+                decision TEXT
             )
+        ''')
+        conn.execute(
+            'INSERT INTO evaluation_results_new (id, name, created_at, decision) SELECT id, name, created_at, decision FROM evaluation_results'
+        )
+        conn.execute('DROP TABLE evaluation_results')
+        conn.execute('ALTER TABLE evaluation_results_new RENAME TO evaluation_results')
+
+    def _create_search_index(self):
+        try:
+            with self._connect() as conn:
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'evaluation_search'"
+                ).fetchone()
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS evaluation_search USING fts5(name, markdown, tokenize='unicode61 remove_diacritics 2')"
+                )
+                if not exists:
+                    cur = conn.execute('''
+                        SELECT r.id, r.name, b.body
+                        FROM evaluation_results r
+                        JOIN evaluation_bodies b ON b.result_id = r.id
+                    ''')
+                    conn.executemany(
+                        'INSERT INTO evaluation_search (rowid, name, markdown) VALUES (?, ?, ?)',
+                        ((result_id, name, decompress_markdown(body)) for result_id, name, body in cur.fetchall())
+                    )
+            self.search_enabled = True
+        except sqlite3.OperationalError as e:
+            # Python builds without FTS5 still work, just without full-text search
+            print(f"Full-text search is disabled: {e}")
+
+    def _index_result(self, conn, result_id, name, markdown):
+        if not self.search_enabled:
+            return
+        conn.execute('DELETE FROM evaluation_search WHERE rowid = ?', (result_id,))
+        conn.execute(
+            'INSERT INTO evaluation_search (rowid, name, markdown) VALUES (?, ?, ?)',
+            (result_id, name, markdown)
+        )
+
+    def _insert_result(self, conn, name, markdown, created_at, decision, prompt_version=None):
+        cur = conn.execute(
+            'INSERT INTO evaluation_results (name, created_at, decision, prompt_version) VALUES (?, ?, ?, ?)',
+            (name, created_at, decision, prompt_version)
+        )
+        conn.execute(
+            'INSERT INTO evaluation_bodies (result_id, body) VALUES (?, ?)',
+            (cur.lastrowid, compress_markdown(markdown))
+        )
+        self._index_result(conn, cur.lastrowid, name, markdown)
+        return cur.lastrowid
+
+    def add_result(self, name, markdown, created_at, decision, prompt_version=None):
+        with self._connect() as conn:
+            return self._insert_result(conn, name, markdown, created_at, decision, prompt_version)
+
+    def get_pool_metrics(self):
+        return self._pool.metrics()
+
+    def get_markdown(self, result_id):
+        """
+        Returns the Markdown body of one evaluation, or None if it doesn't exist.
+        """
+        result_id = int(result_id)
+        with self._markdown_cache_lock:
+            if result_id in self._markdown_cache:
+                self._markdown_cache.move_to_end(result_id)
+                return self._markdown_cache[result_id]
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT body FROM evaluation_bodies WHERE result_id = ?',
+                (result_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        markdown = decompress_markdown(row[0])
+        with self._markdown_cache_lock:
+            self._markdown_cache[result_id] = markdown
+            self._markdown_cache.move_to_end(result_id)
+            while len(self._markdown_cache) > self._markdown_cache_size:
+                self._markdown_cache.popitem(last=False)
+        return markdown
+
+    def _forget_markdown(self, result_id):
+        with self._markdown_cache_lock:
+            self._markdown_cache.pop(int(result_id), None)
 
     def get_result(self, result_id):
         with self._connect() as conn:
             cur = conn.execute(
-                'SELECT id, created_at, name, decision, markdown FROM evaluation_results WHERE id = ?',
+                'SELECT id, created_at, name, decision FROM evaluation_results WHERE id = ?',
                 (result_id,)
             )
-            return cur.fetchone()
+            row = cur.fetchone()
+        if row is None:
+            return None
+        return row + (self.get_markdown(row[0]),)
 
     def get_all_results(self):
+        """
+        Returns (id, created_at, name, decision) for every evaluation. Use
+        get_markdown to load a body.
+        """
         with self._connect() as conn:
-            cur = conn.execute('SELECT id, created_at, name, decision, markdown FROM evaluation_results ORDER BY id')
+            cur = conn.execute('SELECT id, created_at, name, decision FROM evaluation_results ORDER BY id')
             return cur.fetchall()
 
     def update_result(self, result_id, name, markdown):
         with self._connect() as conn:
-            conn.execute(
-                'UPDATE evaluation_results SET name = ?, markdown = ? WHERE id = ?',
-                (name, markdown, result_id)
+            cur = conn.execute(
+                'UPDATE evaluation_results SET name = ? WHERE id = ?',
+                (name, result_id)
             )
+            if cur.rowcount:
+                conn.execute(
+                    'INSERT OR REPLACE INTO evaluation_bodies (result_id, body) VALUES (?, ?)',
+                    (result_id, compress_markdown(markdown))
+                )
+                self._index_result(conn, result_id, name, markdown)
+        self._forget_markdown(result_id)
 
     def delete_result(self, result_id):
         with self._connect() as conn:
@@ -54,14 +295,186 @@ class EvaluationResultDB:
                 'DELETE FROM evaluation_results WHERE id = ?',
                 (result_id,)
             )
+            conn.execute('DELETE FROM evaluation_bodies WHERE result_id = ?', (result_id,))
+            if self.search_enabled:
+                conn.execute('DELETE FROM evaluation_search WHERE rowid = ?', (result_id,))
+        self._forget_markdown(result_id)
+
+    def get_dataframe(self) -> "pd.DataFrame":
+        import pandas as pd
 
-    def get_dataframe(self) -> pd.DataFrame:
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id, name, created_at, decision FROM evaluation_results ORDER BY id")
             rows = cursor.fetchall()
-            df = pd.DataFrame(rows, columns=["ID", "Applicant Name", "Created At", "Decision"])
+            df = pd.DataFrame(rows, columns=HISTORY_COLUMNS)
 
             return df
-        
-     
\ No newline at end of file
+
+    def search(self, text, limit=50) -> "pd.DataFrame":
+        """
+        Full-text search over applicant names and evaluation bodies, best matches
+        first. The Match column holds a snippet with the hits in bold.
+        """
+        import pandas as pd
+
+        query = build_search_query(text)
+        if not self.search_enabled or not query:
+            return pd.DataFrame([], columns=SEARCH_COLUMNS)
+        with self._connect() as conn:
+            cur = conn.execute('''
+                SELECT r.id, r.name, r.created_at, r.decision,
+                       snippet(evaluation_search, 1, '**', '**', ' ... ', 16)
+                FROM evaluation_search
+                JOIN evaluation_results r ON r.id = evaluation_search.rowid
+                WHERE evaluation_search MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            ''', (query, limit))
+            rows = cur.fetchall()
+        return pd.DataFrame(rows, columns=SEARCH_COLUMNS)
+
+    def get_page(
+        self,
+        page=1,
+        page_size=50,
+        sort_by="ID",
+        descending=True,
+        name=None,
+        decision=None,
+        created_from=None,
+        created_before=None
+    ):
+        """
+        Returns one page of the history table as a DataFrame together with the number
+        of rows matching the filters. created_from is inclusive and created_before is
+        exclusive; both are compared with the stored created_at strings.
+        """
+        import pandas as pd
+
+        where, params = build_filter_clause(name, decision, created_from, created_before)
+        column = HISTORY_SORT_COLUMNS.get(sort_by, "id")
+        direction = "DESC" if descending else "ASC"
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM evaluation_results{where}", params).fetchone()[0]
+            cur = conn.execute(
+                f"SELECT id, name, created_at, decision FROM evaluation_results{where} ORDER BY {column} {direction}, id {direction} LIMIT ? OFFSET ?",
+                params + [page_size, (max(page, 1) - 1) * page_size]
+            )
+            rows = cur.fetchall()
+        return pd.DataFrame(rows, columns=HISTORY_COLUMNS), total
+
+    def get_filtered_results(self, name=None, decision=None, created_from=None, created_before=None):
+        """
+        Returns (id, created_at, name, decision) of every evaluation matching the
+        history filters, oldest first.
+        """
+        where, params = build_filter_clause(name, decision, created_from, created_before)
+        with self._connect() as conn:
+            cur = conn.execute(
+                f"SELECT id, created_at, name, decision FROM evaluation_results{where} ORDER BY created_at, id",
+                params
+            )
+            return cur.fetchall()
+
+    def create_batch_job(self, source, total):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._connect() as conn:
+            cur = conn.execute(
+                'INSERT INTO batch_jobs (source, total, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (source, total, 'running', now, now)
+            )
+            return cur.lastrowid
+
+    def get_batch_job(self, job_id):
+        with self._connect() as conn:
+            cur = conn.execute(
+                'SELECT id, source, total, status, created_at, updated_at FROM batch_jobs WHERE id = ?',
+                (job_id,)
+            )
+            return cur.fetchone()
+
+    def update_batch_job(self, job_id, status, total=None):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE batch_jobs SET status = ?, total = COALESCE(?, total), updated_at = ? WHERE id = ?',
+                (status, total, now, job_id)
+            )
+
+    def set_batch_item(self, job_id, applicant_key, status, result_id=None, error=None):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO batch_items (job_id, applicant_key, status, result_id, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, applicant_key, status, result_id, error, now)
+            )
+
+    def get_batch_item_statuses(self, job_id):
+        with self._connect() as conn:
+            cur = conn.execute(
+                'SELECT applicant_key, status FROM batch_items WHERE job_id = ?',
+                (job_id,)
+            )
+            return dict(cur.fetchall())
+
+    def get_batch_dataframe(self, job_id) -> "pd.DataFrame":
+        import pandas as pd
+
+        with self._connect() as conn:
+            cur = conn.execute('''
+                SELECT i.applicant_key, i.status, r.name, r.decision, i.result_id, i.error
+                FROM batch_items i
+                LEFT JOIN evaluation_results r ON r.id = i.result_id
+                WHERE i.job_id = ?
+                ORDER BY i.applicant_key
+            ''', (job_id,))
+            rows = cur.fetchall()
+            return pd.DataFrame(rows, columns=["Applicant", "Status", "Applicant Name", "Decision", "Result ID", "Error"])
+
+    def add_provider_batch(self, job_id, provider, provider_batch_id, model, requests):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._connect() as conn:
+            cur = conn.execute(
+                'INSERT INTO provider_batches (job_id, provider, provider_batch_id, model, requests, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, provider, provider_batch_id, model, json.dumps(requests), 'running', now, now)
+            )
+            return cur.lastrowid
+
+    def get_running_provider_batches(self):
+        with self._connect() as conn:
+            cur = conn.execute(
+                "SELECT id, job_id, provider, provider_batch_id, model, requests FROM provider_batches WHERE status = 'running' ORDER BY id"
+            )
+            return [row[:5] + (json.loads(row[5]),) for row in cur.fetchall()]
+
+    def update_provider_batch(self, batch_row_id, status):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE provider_batches SET status = ?, updated_at = ? WHERE id = ?',
+                (status, now, batch_row_id)
+            )
+
+    def complete_provider_batch(self, batch_row_id, job_id, items):
+        """
+        Stores (applicant_key, (name, markdown, created_at, decision, prompt_version))
+        items, marks them done and the provider batch completed in one transaction,
+        so a batch is never collected twice or half. Returns the new result IDs.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        result_ids = []
+        with self._connect() as conn:
+            for applicant_key, row in items:
+                result_id = self._insert_result(conn, *row)
+                conn.execute(
+                    'INSERT OR REPLACE INTO batch_items (job_id, applicant_key, status, result_id, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (job_id, applicant_key, 'done', result_id, None, now)
+                )
+                result_ids.append(result_id)
+            conn.execute(
+                'UPDATE provider_batches SET status = ?, updated_at = ? WHERE id = ?',
+                ('completed', now, batch_row_id)
+            )
+        return result_ids
+
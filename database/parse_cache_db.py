@@ -0,0 +1,89 @@
+import hashlib
+import time
+from .connection_pool import SQLiteConnectionPool
+
+class ParseCacheDB:
+    """
+    Persistent cache for parsed document text.
+
+    Entries are keyed by the hash of the uploaded file, the file label, the model
+    and the hash of the parsing prompt, so a changed prompt never returns a stale
+    parse. The cache is bounded by total content size and evicts least recently
+    used entries first.
+    """
+    def __init__(self, db_path='parse_cache.db', max_bytes=200 * 1024 * 1024):
+        self.db_path = db_path
+        self._pool = SQLiteConnectionPool(db_path)
+        self.max_bytes = max_bytes
+        self._create_table()
+
+    def _connect(self):
+        return self._pool.connection()
+
+    def _create_table(self):
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS parse_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    file_label TEXT NOT NULL,
+                    model TEXT,
+                    prompt_hash TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_accessed REAL NOT NULL
+                )
+            ''')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_parse_cache_last_accessed ON parse_cache (last_accessed)'
+            )
+
+    @staticmethod
+    def make_key(file_hash, file_label, model, prompt_hash):
+        raw = "|".join([file_hash, file_label, model or "", prompt_hash])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, cache_key):
+        with self._connect() as conn:
+            cur = conn.execute(
+                'SELECT content FROM parse_cache WHERE cache_key = ?',
+                (cache_key,)
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE parse_cache SET last_accessed = ? WHERE cache_key = ?',
+                (time.time(), cache_key)
+            )
+            return row[0]
+
+    def put(self, cache_key, file_label, model, prompt_hash, content):
+        size = len(content.encode('utf-8'))
+        with self._connect() as conn:
+            # Entries parsed with an older version of this label's prompt can never be hit again
+            conn.execute(
+                'DELETE FROM parse_cache WHERE file_label = ? AND prompt_hash != ?',
+                (file_label, prompt_hash)
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO parse_cache (cache_key, file_label, model, prompt_hash, content, size, last_accessed) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (cache_key, file_label, model, prompt_hash, content, size, time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM parse_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        cur = conn.execute('SELECT cache_key, size FROM parse_cache ORDER BY last_accessed')
+        to_delete = []
+        for cache_key, size in cur.fetchall():
+            if total <= self.max_bytes:
+                break
+            to_delete.append((cache_key,))
+            total -= size
+        conn.executemany('DELETE FROM parse_cache WHERE cache_key = ?', to_delete)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM parse_cache')
@@ -0,0 +1,95 @@
+import time
+from .connection_pool import SQLiteConnectionPool
+
+class UploadedFileDB:
+    """
+    Registry of files uploaded to a provider, keyed by content hash, so the same
+    document is uploaded once and its remote copy can be deleted when it expires.
+    Uploads replaced by a newer one of the same file are kept in
+    retired_uploaded_files until they expire, so they are deleted as well.
+    """
+    def __init__(self, db_path='parse_cache.db'):
+        self.db_path = db_path
+        self._pool = SQLiteConnectionPool(db_path)
+        self._create_table()
+
+    def _connect(self):
+        return self._pool.connection()
+
+    def _create_table(self):
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS uploaded_files (
+                    file_hash TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    remote_id TEXT NOT NULL,
+                    uri TEXT,
+                    mime_type TEXT,
+                    uploaded_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (file_hash, provider)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS retired_uploaded_files (
+                    provider TEXT NOT NULL,
+                    remote_id TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (provider, remote_id)
+                )
+            ''')
+
+    def get(self, file_hash, provider, min_remaining_seconds=0):
+        with self._connect() as conn:
+            cur = conn.execute(
+                'SELECT remote_id, uri, mime_type, expires_at FROM uploaded_files WHERE file_hash = ? AND provider = ? AND expires_at > ?',
+                (file_hash, provider, time.time() + min_remaining_seconds)
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            return {"remote_id": row[0], "uri": row[1], "mime_type": row[2], "expires_at": row[3]}
+
+    def put(self, file_hash, provider, remote_id, uri, mime_type, expires_at):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT remote_id, expires_at FROM uploaded_files WHERE file_hash = ? AND provider = ?',
+                (file_hash, provider)
+            ).fetchone()
+            if row is not None and row[0] != remote_id:
+                # A running parse may still use the old upload, so it is deleted once it expires
+                conn.execute(
+                    'INSERT OR REPLACE INTO retired_uploaded_files (provider, remote_id, expires_at) VALUES (?, ?, ?)',
+                    (provider, row[0], row[1])
+                )
+            conn.execute(
+                'INSERT OR REPLACE INTO uploaded_files (file_hash, provider, remote_id, uri, mime_type, uploaded_at, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (file_hash, provider, remote_id, uri, mime_type, time.time(), expires_at)
+            )
+
+    def get_expired(self, provider):
+        """
+        Remote IDs of the provider's expired uploads, current and retired.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                '''
+                SELECT remote_id FROM uploaded_files WHERE provider = ? AND expires_at <= ?
+                UNION
+                SELECT remote_id FROM retired_uploaded_files WHERE provider = ? AND expires_at <= ?
+                ''',
+                (provider, now, provider, now)
+            )
+            return [row[0] for row in cur.fetchall()]
+
+    def delete(self, remote_id, provider):
+        with self._connect() as conn:
+            conn.execute(
+                'DELETE FROM uploaded_files WHERE remote_id = ? AND provider = ?',
+                (remote_id, provider)
+            )
+            conn.execute(
+                'DELETE FROM retired_uploaded_files WHERE remote_id = ? AND provider = ?',
+                (remote_id, provider)
+            )
@@ -0,0 +1,197 @@
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import TEXT_LAYER_FAST_PATH, TEXT_LAYER_MIN_CHARS_PER_PAGE, TEXT_LAYER_MIN_GLYPH_RATIO
+from config import OCR_ENGINE, OCR_LANGUAGE, OCR_DPI, OCR_WORKERS
+
+def extract_pdf_text_layer(file_path, structure_rows=False):
+    """
+    Returns the text of a digitally generated PDF, or None when the file is not a PDF
+    or its text layer is too sparse or garbled to parse without uploading the file.
+    With structure_rows, table rows are kept on one line so courses stay aligned.
+    """
+    if not TEXT_LAYER_FAST_PATH or not file_path.lower().endswith(".pdf"):
+        return None
+    import fitz
+
+    try:
+        with fitz.open(file_path) as doc:
+            if doc.page_count == 0:
+                return None
+            pages = []
+            for page in doc:
+                page_text = get_page_text(page, structure_rows)
+                if is_scanned_page(page, page_text):
+                    return None
+                pages.append(page_text)
+    except Exception as e:
+        print(f"Error during text layer extraction: {e}")
+        return None
+
+    text = "\n".join(pages)
+    # Too little text for the number of pages means most of the content is not in the text layer
+    if len("".join(text.split())) < TEXT_LAYER_MIN_CHARS_PER_PAGE * len(pages) or not has_readable_text(text):
+        return None
+    return text
+
+def has_readable_text(text):
+    glyphs = [char for char in text if not char.isspace()]
+    if not glyphs:
+        return False
+    # Fonts without a usable encoding come out as replacement or control characters
+    readable = sum(1 for char in glyphs if char != '\ufffd' and char.isprintable())
+    return readable / len(glyphs) >= TEXT_LAYER_MIN_GLYPH_RATIO
+
+def get_page_text(page, structure_rows=False, textpage=None):
+    if structure_rows:
+        return get_page_text_by_rows(page, textpage)
+    return page.get_text(textpage=textpage)
+
+def is_scanned_page(page, page_text):
+    # A page that is mostly image with little text is a scan
+    return len(page_text.strip()) < TEXT_LAYER_MIN_CHARS_PER_PAGE and get_image_coverage(page) > 0.5
+
+def get_image_coverage(page):
+    import fitz
+
+    page_area = abs(page.rect) or 1
+    image_area = sum(abs(fitz.Rect(image["bbox"]) & page.rect) for image in page.get_image_info())
+    return image_area / page_area
+
+def get_page_text_by_rows(page, textpage=None):
+    """
+    Rebuilds the page line by line from word positions, so the cells of one table
+    row (course, credits, grade) end up on one line separated by " | ".
+    """
+    rows = []
+    for word in sorted(page.get_text("words", textpage=textpage), key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        center = (word[1] + word[3]) / 2
+        if rows and abs(center - rows[-1][0]) <= (word[3] - word[1]) / 2:
+            rows[-1][1].append(word)
+        else:
+            rows.append([center, [word]])
+
+    lines = []
+    for _, words in rows:
+        words.sort(key=lambda w: w[0])
+        line = words[0][4]
+        for previous, word in zip(words, words[1:]):
+            char_width = (previous[2] - previous[0]) / max(len(previous[4]), 1)
+            line += (" | " if word[0] - previous[2] > 2 * char_width else " ") + word[4]
+        lines.append(line)
+    return "\n".join(lines)
+
+class OCREngine:
+    """
+    Base class for local OCR engines. ocr_page runs in a worker process, so
+    engines must be picklable and open the file themselves.
+    """
+    name = "none"
+
+    def settings_key(self):
+        return self.name
+
+    def ocr_page(self, file_path, page_number, structure_rows=False):
+        raise NotImplementedError("Subclasses must implement ocr_page()")
+
+class TesseractOCREngine(OCREngine):
+    """
+    OCR through PyMuPDF's Tesseract integration. Needs Tesseract installed and
+    TESSDATA_PREFIX pointing at its language data.
+    """
+    name = "tesseract"
+
+    def __init__(self, language="eng", dpi=300):
+        self.language = language
+        self.dpi = dpi
+
+    def settings_key(self):
+        return f"{self.name}:{self.language}:{self.dpi}"
+
+    def ocr_page(self, file_path, page_number, structure_rows=False):
+        with open_as_pdf(file_path) as doc:
+            page = doc[page_number]
+            textpage = page.get_textpage_ocr(language=self.language, dpi=self.dpi, full=True)
+            return get_page_text(page, structure_rows, textpage)
+
+OCR_ENGINES = {
+    "tesseract": TesseractOCREngine,
+}
+
+_ocr_executor = None
+_ocr_executor_lock = threading.Lock()
+
+def get_ocr_engine():
+    if OCR_ENGINE not in OCR_ENGINES:
+        return None
+    return OCR_ENGINES[OCR_ENGINE](language=OCR_LANGUAGE, dpi=OCR_DPI)
+
+def get_ocr_executor():
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            # Started from Gradio's worker threads, where forking could copy locks other threads hold
+            _ocr_executor = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _ocr_executor
+
+def open_as_pdf(file_path):
+    import fitz
+
+    doc = fitz.open(file_path)
+    if doc.is_pdf:
+        return doc
+    # Images open as single page documents that have no page to hold OCR text
+    pdf_bytes = doc.convert_to_pdf()
+    doc.close()
+    return fitz.open("pdf", pdf_bytes)
+
+def ocr_document(file_path, file_hash, structure_rows=False, cache=None):
+    """
+    Reads an image or scanned PDF with the configured local OCR engine, OCR-ing
+    pages in parallel worker processes. Pages that already have a usable text
+    layer are read directly. OCR text is cached per page in cache (a ParseCacheDB).
+    Returns None when OCR is disabled, fails or finds too little text.
+    """
+    engine = get_ocr_engine()
+    if engine is None:
+        return None
+
+    settings_hash = hashlib.sha256(engine.settings_key().encode("utf-8")).hexdigest()
+    cache_label = "ocr_rows" if structure_rows else "ocr"
+    try:
+        with open_as_pdf(file_path) as doc:
+            pages = []
+            for page in doc:
+                page_text = get_page_text(page, structure_rows)
+                needs_ocr = is_scanned_page(page, page_text) or not has_readable_text(page_text)
+                pages.append(None if needs_ocr else page_text)
+
+        cache_keys = {}
+        for page_number, page_text in enumerate(pages):
+            if page_text is not None:
+                continue
+            cache_keys[page_number] = cache.make_key(f"{file_hash}:{page_number}", cache_label, engine.name, settings_hash) if cache else None
+            cached = cache.get(cache_keys[page_number]) if cache else None
+            if cached is not None:
+                pages[page_number] = cached
+
+        missing = [page_number for page_number, page_text in enumerate(pages) if page_text is None]
+        if missing:
+            executor = get_ocr_executor()
+            futures = {
+                page_number: executor.submit(engine.ocr_page, file_path, page_number, structure_rows)
+                for page_number in missing
+            }
+            for page_number, future in futures.items():
+                pages[page_number] = future.result()
+                if cache:
+                    cache.put(cache_keys[page_number], cache_label, engine.name, settings_hash, pages[page_number])
+    except Exception as e:
+        print(f"Error during OCR: {e}")
+        return None
+
+    text = "\n".join(pages)
+    if len(text.strip()) < TEXT_LAYER_MIN_CHARS_PER_PAGE:
+        return None
+    return text
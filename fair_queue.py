@@ -0,0 +1,132 @@
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+class Ticket:
+    """
+    A place in a FairQueue. granted is set once the holder may start.
+    """
+    def __init__(self, queue, user):
+        self.queue = queue
+        self.user = user
+        self.granted = threading.Event()
+
+    def position(self):
+        """
+        Number of waiting requests served before this one, 0 once granted.
+        """
+        return self.queue.position(self)
+
+    async def wait(self, timeout):
+        """
+        Waits up to timeout seconds for the slot and returns whether it was granted.
+        """
+        # Polling keeps waiting requests off the thread pool and works across event loops
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not self.granted.is_set():
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(0.1, remaining))
+        return True
+
+    def release(self):
+        self.queue.release(self)
+
+class FairQueue:
+    """
+    Runs at most limit requests at a time. A free slot goes to the waiting user
+    with the fewest requests running and, among those, the one served longest
+    ago, so one reviewer submitting many evaluations can't make everybody else
+    wait behind all of them. Requests of the same user run in the order they
+    came in.
+    """
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self._active = 0
+        self._active_by_user = {}
+        # user -> waiting tickets, in arrival order of the users
+        self._waiting = OrderedDict()
+        # user -> number of the user's last grant, for users with requests in the queue
+        self._last_served = {}
+        self._grants = 0
+        self._lock = threading.Lock()
+
+    def enter(self, user):
+        ticket = Ticket(self, user)
+        with self._lock:
+            self._waiting.setdefault(user, deque()).append(ticket)
+            self._dispatch()
+        return ticket
+
+    @staticmethod
+    def _next_user(waiting, active_by_user, last_served):
+        return min(waiting, key=lambda user: (active_by_user.get(user, 0), last_served.get(user, 0)))
+
+    def _dispatch(self):
+        while self._active < self.limit and self._waiting:
+            user = self._next_user(self._waiting, self._active_by_user, self._last_served)
+            tickets = self._waiting[user]
+            ticket = tickets.popleft()
+            if not tickets:
+                del self._waiting[user]
+            self._grants += 1
+            self._last_served[user] = self._grants
+            self._active += 1
+            self._active_by_user[user] = self._active_by_user.get(user, 0) + 1
+            ticket.granted.set()
+
+    def release(self, ticket):
+        """
+        Frees the slot of a granted ticket or withdraws a waiting one.
+        """
+        with self._lock:
+            if ticket.granted.is_set():
+                self._active -= 1
+                self._active_by_user[ticket.user] -= 1
+                if not self._active_by_user[ticket.user]:
+                    del self._active_by_user[ticket.user]
+            else:
+                tickets = self._waiting.get(ticket.user)
+                if tickets and ticket in tickets:
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._waiting[ticket.user]
+            if ticket.user not in self._waiting and ticket.user not in self._active_by_user:
+                self._last_served.pop(ticket.user, None)
+            self._dispatch()
+
+    def position(self, ticket):
+        """
+        Estimated number of waiting requests that start before ticket, found by
+        replaying the dispatch order on a copy of the queue.
+        """
+        with self._lock:
+            if ticket.granted.is_set():
+                return 0
+            waiting = OrderedDict((user, deque(tickets)) for user, tickets in self._waiting.items())
+            active_by_user = dict(self._active_by_user)
+            last_served = dict(self._last_served)
+            grants = self._grants
+        ahead = 0
+        while waiting:
+            user = self._next_user(waiting, active_by_user, last_served)
+            tickets = waiting[user]
+            if tickets.popleft() is ticket:
+                return ahead
+            if not tickets:
+                del waiting[user]
+            grants += 1
+            last_served[user] = grants
+            active_by_user[user] = active_by_user.get(user, 0) + 1
+            ahead += 1
+        return 0
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "active": self._active,
+                "waiting": sum(len(tickets) for tickets in self._waiting.values()),
+                "waiting_users": len(self._waiting)
+            }
@@ -1,71 +1,689 @@
-from config import ACTIVE_PROVIDER, API_KEYS, MODEL_TO_USE
-from providers.openai_provider import OpenAIProvider
-from providers.google_provider import GoogleProvider
+from config import ACTIVE_PROVIDER, API_KEYS, MODEL_TO_USE, PARSE_CACHE_DB_PATH, PARSE_CACHE_MAX_MB, PARSE_WORKERS
+from config import UPLOADED_FILE_RETENTION_HOURS, UPLOADED_FILE_SWEEP_MINUTES, HISTORY_PAGE_SIZE, PROMPT_DIR, PROMPT_SET, PROMPT_CACHE_TTL_SECONDS
+from config import EVALUATION_INPUT_TOKEN_BUDGET, MAX_OUTPUT_TOKENS, MODEL_CONTEXT_WINDOW
+from config import LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES
+from config import FALLBACK_PROVIDER, FALLBACK_MODEL, HEDGED_TASKS, TASK_MODELS
+from providers.throttled_provider import ThrottledProvider
+from providers.model_router import ModelRouter
 from database.evaluation_result_db import EvaluationResultDB 
-import gradio as gr
+from database.parse_cache_db import ParseCacheDB
+from database.uploaded_file_db import UploadedFileDB
+from prompt_registry import PromptRegistry
+from token_budget import fit_sections, choose_output_tokens, get_context_window, MIN_OUTPUT_TOKENS
+from document_text import extract_pdf_text_layer, ocr_document
+from lazy_loading import LazyObject, LazyMapping
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
 
-db = EvaluationResultDB()
+# Databases and providers are created on first use to keep startup fast
+db = LazyObject(EvaluationResultDB)
+parse_cache = LazyObject(ParseCacheDB, PARSE_CACHE_DB_PATH, max_bytes=PARSE_CACHE_MAX_MB * 1024 * 1024)
+uploaded_files = LazyObject(UploadedFileDB, PARSE_CACHE_DB_PATH)
+
+# Don't hand out an uploaded file that expires before a slow parse could finish with it
+UPLOADED_FILE_MIN_REMAINING_SECONDS = 10 * 60
+upload_locks = [threading.Lock() for _ in range(64)]
 
 def get_provider(name: str):
+    # Each SDK is imported only when its provider is first needed
     if name == "openai":
-        return OpenAIProvider(API_KEYS["openai_api_key"])
+        from providers.openai_provider import OpenAIProvider
+        model_provider = OpenAIProvider(API_KEYS["openai_api_key"])
     elif name == "gemini":
-        return GoogleProvider(API_KEYS["gemini_api_key"])
+        from providers.google_provider import GoogleProvider
+        model_provider = GoogleProvider(API_KEYS["gemini_api_key"], cache_ttl_seconds=PROMPT_CACHE_TTL_SECONDS)
     else:
         raise ValueError(f"Unsupported provider: {name}")
+    return ThrottledProvider(
+        model_provider,
+        requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_retries=LLM_MAX_RETRIES
+    )
     
-provider = get_provider(ACTIVE_PROVIDER)
+def parse_model_route(value):
+    """
+    Turns "model" or "provider:model" into (provider, model); a bare model runs on
+    ACTIVE_PROVIDER.
+    """
+    provider_name, separator, model = value.partition(":")
+    if separator and provider_name in ("openai", "gemini"):
+        return provider_name, model
+    return ACTIVE_PROVIDER, value
+
+def get_model_routes():
+    fallback = [(FALLBACK_PROVIDER, FALLBACK_MODEL)] if FALLBACK_PROVIDER and FALLBACK_MODEL else []
+    routes = {"default": [(ACTIVE_PROVIDER, MODEL_TO_USE)] + fallback}
+    for task, value in TASK_MODELS.items():
+        if value:
+            route = parse_model_route(value)
+            routes[task] = [route] + [other for other in fallback if other != route]
+    return routes
+
+model_routes = get_model_routes()
+providers = LazyMapping(
+    get_provider,
+    [ACTIVE_PROVIDER] + [provider_name for task_routes in model_routes.values() for provider_name, _ in task_routes]
+)
+# Files are uploaded to the active provider; it also serves token counts
+provider = LazyObject(lambda: providers[ACTIVE_PROVIDER])
+router = ModelRouter(providers, model_routes, files_provider=ACTIVE_PROVIDER, hedged_tasks=HEDGED_TASKS)
+
+def get_task_route(task):
+    """
+    Returns the configured (provider name, model) of a task.
+    """
+    return model_routes.get(task, model_routes["default"])[0]
+
+def get_task_model(task):
+    return get_task_route(task)[1]
 
-def get_prompt_text(filepath):
+prompts = PromptRegistry(PROMPT_DIR, PROMPT_SET)
+
+PARSING_PROMPTS = {
+    "essay": ["essay_parsing_prompt", "essay_topics"],
+    "transcript": ["transcript_parsing_prompt"],
+    "vpd": ["vpd_parsing_prompt"],
+}
+
+# Prompts that shape a stored evaluation, recorded as its prompt version
+EVALUATION_PROMPTS = sorted(
+    {name for names in PARSING_PROMPTS.values() for name in names}
+    | {"summary_evaluation_prompt", "structured_evaluation_output", "extract_applicant_name", "get_decision_from_evaluation_summary"}
+)
+
+def get_prompt_text(name):
+    """
+    Returns a normalized prompt by name or by path to its file, served from the
+    prompt registry.
+    """
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            content = file.read()
-            headers_to_be_removed = [
-                "[ PROFILE ]",
-                "[ DIRECTIVE ]",
-                "[ CONTEXT ]",
-                "[ WORKFLOW ]",
-                "[ CONSTRAINT ]",
-                "[ OUTPUT STYLE ]",
-                "[ EXAMPLE ]"
-            ]
-
-            for header in headers_to_be_removed:
-                content = content.replace(header, "")
-            
-            content = content.replace("\n", "")
-        return content
+        return prompts.get(name)
     except FileNotFoundError:
-        print(f"Error: File '{filepath}' not found.")
+        print(f"Error: File '{prompts.resolve(name)}' not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
 
+def hash_file(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def hash_text(text):
+    return hashlib.sha256((text or "").encode('utf-8')).hexdigest()
+
 def generate_response(
     message: str,
     system_prompt: str, 
     temperature: float = 0.5, 
-    max_tokens: int = 6000,
-    contents: list = []
+    max_tokens: int = MAX_OUTPUT_TOKENS,
+    contents: list = [],
+    response_schema: dict = None,
+    instructions: str = None,
+    task: str = "default"
 ):
-    response = provider.generate_text(
-        model=MODEL_TO_USE,
+    response = router.generate_text(
+        task=task,
         prompt=message,
         system_prompt=system_prompt,
         temperature=temperature,
         max_tokens=max_tokens,
-        contents=contents
+        contents=contents,
+        response_schema=response_schema,
+        instructions=instructions
     )
     return response     
 
-def get_decision(evaluation_summary):
-    instruction_prompt = get_prompt_text("prompt_text/get_decision_from_evaluation_summary.txt")  
-    final_prompt = f"""
-    {instruction_prompt}
-    {evaluation_summary}
+async def agenerate_response(
+    message: str,
+    system_prompt: str, 
+    temperature: float = 0.5, 
+    max_tokens: int = MAX_OUTPUT_TOKENS,
+    contents: list = [],
+    response_schema: dict = None,
+    instructions: str = None,
+    task: str = "default"
+):
+    response = await router.agenerate_text(
+        task=task,
+        prompt=message,
+        system_prompt=system_prompt,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        contents=contents,
+        response_schema=response_schema,
+        instructions=instructions
+    )
+    return response
+
+async def agenerate_response_stream(
+    message: str,
+    system_prompt: str, 
+    temperature: float = 0.5, 
+    max_tokens: int = MAX_OUTPUT_TOKENS,
+    contents: list = [],
+    response_schema: dict = None,
+    instructions: str = None,
+    task: str = "default"
+):
+    async for chunk in router.agenerate_text_stream(
+        task=task,
+        prompt=message,
+        system_prompt=system_prompt,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        contents=contents,
+        response_schema=response_schema,
+        instructions=instructions
+    ):
+        yield chunk
+
+def extract_raw_text_from_file(file_path):
+    """
+    Extracts text from an essay.
+    """
+    import fitz
+
+    raw_text = ""
+    try:
+        with fitz.open(file_path) as doc:
+            for page in doc:
+                raw_text += page.get_text()
+        
+    except Exception as e:
+        print(f"Error during raw text extraction: {e}")
+    return raw_text
+
+def get_local_document_text(file_path, file_hash, file_label):
+    """
+    Returns the document's text from its PDF text layer or the local OCR engine,
+    or None when the file has to be uploaded to the model.
+    """
+    structure_rows = file_label == "transcript"
+    document_text = extract_pdf_text_layer(file_path, structure_rows=structure_rows)
+    if document_text is None:
+        document_text = ocr_document(file_path, file_hash, structure_rows=structure_rows, cache=parse_cache)
+    return document_text
+
+def get_uploaded_file_record(file_hash):
+    return uploaded_files.get(file_hash, ACTIVE_PROVIDER, min_remaining_seconds=UPLOADED_FILE_MIN_REMAINING_SECONDS)
+
+def register_uploaded_file(file_hash, file):
+    try:
+        record = provider.describe_uploaded_file(file)
+    except NotImplementedError:
+        return
+    expires_at = time.time() + UPLOADED_FILE_RETENTION_HOURS * 3600
+    if record["expires_at"] is not None:
+        expires_at = min(expires_at, record["expires_at"])
+    uploaded_files.put(file_hash, ACTIVE_PROVIDER, record["remote_id"], record["uri"], record["mime_type"], expires_at)
+
+def upload_lock(file_hash):
+    # Striped so that parses of the same file upload it once without keeping a lock per file
+    return upload_locks[int(file_hash[:8], 16) % len(upload_locks)]
+
+def upload_file_once(file_path, file_hash):
+    """
+    Returns a provider handle for the file, reusing an earlier upload of the same content.
+    """
+    record = get_uploaded_file_record(file_hash)
+    if record is not None:
+        return provider.file_from_record(record)
+    with upload_lock(file_hash):
+        # Another parse of the same file may have uploaded it while we waited
+        record = get_uploaded_file_record(file_hash)
+        if record is not None:
+            return provider.file_from_record(record)
+        file = provider.upload_file_to_model(file_path=file_path)
+        register_uploaded_file(file_hash, file)
+        return file
+
+async def aupload_file_once(file_path, file_hash):
+    record = get_uploaded_file_record(file_hash)
+    if record is not None:
+        return provider.file_from_record(record)
+    lock = upload_lock(file_hash)
+    # Polling keeps the event loop free while a thread or another loop holds the lock
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(0.05)
+    try:
+        record = get_uploaded_file_record(file_hash)
+        if record is not None:
+            return provider.file_from_record(record)
+        file = await provider.aupload_file(file_path=file_path)
+        register_uploaded_file(file_hash, file)
+        return file
+    finally:
+        lock.release()
+
+def sweep_uploaded_files():
+    """
+    Deletes expired uploads from the provider and forgets them.
+    """
+    for remote_id in uploaded_files.get_expired(ACTIVE_PROVIDER):
+        try:
+            provider.delete_uploaded_file(remote_id)
+        except Exception as e:
+            # Providers that expire files themselves may already have deleted it
+            print(f"Could not delete uploaded file {remote_id}: {e}")
+        uploaded_files.delete(remote_id, ACTIVE_PROVIDER)
+
+def start_uploaded_file_sweeper():
+    def sweep_forever():
+        while True:
+            try:
+                sweep_uploaded_files()
+            except Exception as e:
+                print(f"Uploaded file sweep failed: {e}")
+            time.sleep(UPLOADED_FILE_SWEEP_MINUTES * 60)
+
+    thread = threading.Thread(target=sweep_forever, name="uploaded-file-sweeper", daemon=True)
+    thread.start()
+    return thread
+
+PARSING_SYSTEM_PROMPT = "You are an assistant to extract text from files"
+
+# The parsing prompt is sent as cacheable instructions ahead of the file, so the request itself only points at it
+PARSE_FILE_MESSAGE = "Extract the attached document following the instructions above."
+
+def build_text_parsing_message(document_text):
+    return f"""
+--- BEGIN DOCUMENT TEXT ---
+{document_text}
+--- END DOCUMENT TEXT ---
+"""
+
+def get_parsing_prompt(file_label):
+    if file_label not in PARSING_PROMPTS:
+        return None
+    return "".join(get_prompt_text(name) for name in PARSING_PROMPTS[file_label])
+
+def get_prompt_version(names=EVALUATION_PROMPTS):
+    return prompts.version(names)
+
+def extract_text_with_model(file_path, file_label):
+    prompt = get_parsing_prompt(file_label)
+    if prompt is None:
+        return
+
+    prompt_hash = get_prompt_version(PARSING_PROMPTS[file_label])
+    file_hash = hash_file(file_path)
+    model = get_task_model(f"parse_{file_label}")
+    cache_key = parse_cache.make_key(file_hash, file_label, model, prompt_hash)
+    cached = parse_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Digitally generated PDFs and, with local OCR, scans are parsed from their text, without uploading the file
+    document_text = get_local_document_text(file_path, file_hash, file_label)
+    if document_text:
+        response = generate_response(
+            message=build_text_parsing_message(document_text),
+            system_prompt=PARSING_SYSTEM_PROMPT,
+            instructions=prompt,
+            task=f"parse_{file_label}"
+        )
+    else:
+        file = upload_file_once(file_path, file_hash)
+        response = generate_response(
+            message=PARSE_FILE_MESSAGE,
+            system_prompt=PARSING_SYSTEM_PROMPT,
+            contents=[file],
+            instructions=prompt,
+            task=f"parse_{file_label}"
+        )
+
+    if response:
+        parse_cache.put(cache_key, file_label, model, prompt_hash, response)
+    
+    return response
+
+async def aextract_text_with_model(file_path, file_label):
+    prompt = get_parsing_prompt(file_label)
+    if prompt is None:
+        return
+
+    prompt_hash = get_prompt_version(PARSING_PROMPTS[file_label])
+    file_hash = hash_file(file_path)
+    model = get_task_model(f"parse_{file_label}")
+    cache_key = parse_cache.make_key(file_hash, file_label, model, prompt_hash)
+    cached = parse_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    document_text = await asyncio.to_thread(get_local_document_text, file_path, file_hash, file_label)
+    if document_text:
+        response = await agenerate_response(
+            message=build_text_parsing_message(document_text),
+            system_prompt=PARSING_SYSTEM_PROMPT,
+            instructions=prompt,
+            task=f"parse_{file_label}"
+        )
+    else:
+        file = await aupload_file_once(file_path, file_hash)
+        response = await agenerate_response(
+            message=PARSE_FILE_MESSAGE,
+            system_prompt=PARSING_SYSTEM_PROMPT,
+            contents=[file],
+            instructions=prompt,
+            task=f"parse_{file_label}"
+        )
+
+    if response:
+        parse_cache.put(cache_key, file_label, model, prompt_hash, response)
+
+    return response
+
+def parse_documents(essay_path=None, transcript_path=None, vpd_path=None):
     """
+    Parses the essay, transcript and VPD at the same time and counts the essay words
+    alongside the model calls. Missing documents are returned as empty strings.
+    """
+    results = {"essay": "", "transcript": "", "vpd": "", "essay_word_count": 0}
+    with ThreadPoolExecutor(max_workers=PARSE_WORKERS) as executor:
+        futures = {}
+        for file_label, file_path in (("essay", essay_path), ("transcript", transcript_path), ("vpd", vpd_path)):
+            if file_path:
+                futures[file_label] = executor.submit(extract_text_with_model, file_path, file_label)
+        if essay_path:
+            futures["essay_word_count"] = executor.submit(
+                lambda: len(extract_raw_text_from_file(essay_path).split())
+            )
+
+        for key, future in futures.items():
+            try:
+                results[key] = future.result() or results[key]
+            except Exception as e:
+                print(f"Error while parsing {key}: {e}")
+    return results
+
+async def aparse_documents(essay_path=None, transcript_path=None, vpd_path=None):
+    """
+    Async variant of parse_documents for handlers running on the event loop.
+    """
+    results = {"essay": "", "transcript": "", "vpd": "", "essay_word_count": 0}
+    keys = []
+    tasks = []
+    for file_label, file_path in (("essay", essay_path), ("transcript", transcript_path), ("vpd", vpd_path)):
+        if file_path:
+            keys.append(file_label)
+            tasks.append(aextract_text_with_model(file_path, file_label))
+    if essay_path:
+        keys.append("essay_word_count")
+        tasks.append(asyncio.to_thread(lambda: len(extract_raw_text_from_file(essay_path).split())))
+
+    for key, result in zip(keys, await asyncio.gather(*tasks, return_exceptions=True)):
+        if isinstance(result, Exception):
+            print(f"Error while parsing {key}: {result}")
+        elif result:
+            results[key] = result
+    return results
+
+def parse_applicant_name(transcript_content):
+    """
+    Reads the name from the "Name : ..." line the transcript parsing prompt asks
+    for. Returns None when there is no such line or it doesn't hold a name.
+    """
+    match = re.search(r'^[\s*#-]*Name\s*\**\s*:\s*\**\s*(.+?)\s*\**\s*$', transcript_content or "", re.MULTILINE | re.IGNORECASE)
+    if not match:
+        return None
+    name = match.group(1)
+    if "NO_NAME_FOUND" in name or not re.search(r'[^\W\d_]', name) or len(name) > 100:
+        return None
+    return sanitize_applicant_name(name)
+
+def extract_applicant_name(transcript_content):
+    """
+    Extracts the applicant's name to create a sanitized filename. The name is
+    read from the parsed transcript when possible and asked from the model
+    otherwise.
+    """
+    name = parse_applicant_name(transcript_content)
+    if name:
+        return name
+
+    prompt = get_prompt_text("extract_applicant_name")
+    try:
+        # Use the existing generate_response helper
+        name_response = generate_response(
+            message=transcript_content,
+            system_prompt=prompt,
+            task="name"
+        )
+        return sanitize_applicant_name(name_response)
+    except Exception as e:
+        print(f"Could not extract applicant name: {e}")
+        return "Unknown_Applicant"
+
+def sanitize_applicant_name(name_response):
+    """
+    Turns the model's name answer into a name that is safe to use in a filename,
+    or Unknown_Applicant when it doesn't hold one.
+    """
+    # Clean the response to get just the name
+    name = (name_response or "").strip().split('\n')[0]
+    # The name prompts ask for NO_NAME_FOUND when the documents don't give a name
+    if "NO_NAME_FOUND" in name:
+        return "Unknown_Applicant"
+    # Sanitize for use in a filename
+    sanitized_name = re.sub(r'[^\w\s-]', '', name).strip()
+    sanitized_name = re.sub(r'[-\s]+', '_', sanitized_name)
+    return sanitized_name if sanitized_name else "Unknown_Applicant"
+
+EVALUATION_SYSTEM_PROMPT = "You are an expert Admissions Committee Member for a competitive Master's program that gives score exactly based on provided documents"
+
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "applicant_name": {"type": "string"},
+        "decision": {"type": "string", "enum": ["ACCEPTED", "REJECTED"]},
+        "curriculum_score": {"type": "number"},
+        "gpa_score": {"type": "number"},
+        "essay_score": {"type": "number"},
+        "total_score": {"type": "number"},
+        "markdown": {"type": "string"}
+    },
+    "required": ["applicant_name", "decision", "curriculum_score", "gpa_score", "essay_score", "total_score", "markdown"],
+    "additionalProperties": False
+}
+
+def get_evaluation_instructions(structured=False):
+    """
+    The static part of the evaluation request, sent ahead of the applicant's
+    documents so providers can serve it from their prompt cache.
+    """
+    instruction_prompt = get_prompt_text("summary_evaluation_prompt")
+    if structured:
+        instruction_prompt += get_prompt_text("structured_evaluation_output")
+    return instruction_prompt
+
+def build_evaluation_prompt(essay_content, transcript_content, vpd_content=""):
+    return f"""
+--- BEGIN ESSAY ---
+{essay_content}
+--- END ESSAY ---
+
+--- BEGIN TRANSCRIPT ---
+{transcript_content}
+--- END TRANSCRIPT ---
+{
+    "" if vpd_content == "" else
+    "--- BEGIN vpd_german_grade --- " +
+    vpd_content +
+    "--- END vpd_german_grade ---"
+}
+"""
+
+def count_tokens(text):
+    # Counted by the provider the evaluation is routed to, which may not be ACTIVE_PROVIDER
+    provider_name, model = get_task_route("evaluate")
+    return providers[provider_name].count_tokens(model, text)
+
+def get_task_context_window(task):
+    """
+    MODEL_CONTEXT_WINDOW if set, otherwise the smallest context window of the
+    task's routes, since the request is built before the router picks one.
+    """
+    if MODEL_CONTEXT_WINDOW:
+        return MODEL_CONTEXT_WINDOW
+    return min(get_context_window(model) for _, model in model_routes.get(task, model_routes["default"]))
+
+def build_evaluation_request(essay_content, transcript_content, vpd_content="", structured=False):
+    """
+    Returns the message, instructions and max_tokens of an evaluation call. The
+    documents are compacted and, if the request would exceed
+    EVALUATION_INPUT_TOKEN_BUDGET or leave too little of the evaluate model's
+    context window for the answer, the longest ones are shortened. The output
+    limit shrinks when the context window can't fit MAX_OUTPUT_TOKENS.
+    """
+    context_window = get_task_context_window("evaluate")
+    input_budget = min(EVALUATION_INPUT_TOKEN_BUDGET, context_window - MIN_OUTPUT_TOKENS)
+    instructions = get_evaluation_instructions(structured)
+    fixed_tokens = count_tokens(EVALUATION_SYSTEM_PROMPT) + count_tokens(instructions) + count_tokens(build_evaluation_prompt("", ""))
+    sections, section_tokens = fit_sections(
+        {"essay": essay_content, "transcript": transcript_content, "vpd": vpd_content},
+        input_budget - fixed_tokens,
+        count_tokens
+    )
+    input_tokens = fixed_tokens + sum(section_tokens.values())
+    return {
+        "message": build_evaluation_prompt(sections["essay"], sections["transcript"], sections["vpd"]),
+        "instructions": instructions,
+        "max_tokens": choose_output_tokens(input_tokens, context_window, MAX_OUTPUT_TOKENS)
+    }
+
+def analyze_documents(essay_content, transcript_content, vpd_content=""):
+    return generate_response(
+        system_prompt=EVALUATION_SYSTEM_PROMPT,
+        task="evaluate",
+        **build_evaluation_request(essay_content, transcript_content, vpd_content)
+    )
+
+async def aanalyze_documents_stream(essay_content, transcript_content, vpd_content=""):
+    async for chunk in agenerate_response_stream(
+        system_prompt=EVALUATION_SYSTEM_PROMPT,
+        task="evaluate",
+        **build_evaluation_request(essay_content, transcript_content, vpd_content)
+    ):
+        yield chunk
+
+def analyze_documents_structured(essay_content, transcript_content, vpd_content=""):
+    return generate_response(
+        system_prompt=EVALUATION_SYSTEM_PROMPT,
+        response_schema=EVALUATION_SCHEMA,
+        task="evaluate",
+        **build_evaluation_request(essay_content, transcript_content, vpd_content, structured=True)
+    )
+
+async def aanalyze_documents_structured_stream(essay_content, transcript_content, vpd_content=""):
+    async for chunk in agenerate_response_stream(
+        system_prompt=EVALUATION_SYSTEM_PROMPT,
+        response_schema=EVALUATION_SCHEMA,
+        task="evaluate",
+        **build_evaluation_request(essay_content, transcript_content, vpd_content, structured=True)
+    ):
+        yield chunk
+
+def parse_structured_evaluation(raw_output):
+    """
+    Parses the JSON evaluation returned for EVALUATION_SCHEMA. Returns None when the
+    output is not valid JSON or misses the decision or Markdown body.
+    """
+    try:
+        evaluation = json.loads(raw_output)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(evaluation, dict):
+        return None
+    decision = str(evaluation.get("decision", "")).strip().upper()
+    markdown = evaluation.get("markdown")
+    if decision not in ("ACCEPTED", "REJECTED") or not isinstance(markdown, str) or not markdown.strip():
+        return None
+    evaluation["decision"] = decision
+    evaluation["applicant_name"] = sanitize_applicant_name(str(evaluation.get("applicant_name", "")))
+    return evaluation
+
+def extract_partial_json_string(partial_json, field):
+    """
+    Returns the value of a string field from a JSON object that may still be
+    streaming in, so the Markdown body can be shown before the object is complete.
+    """
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(field), partial_json or "")
+    if not match:
+        return ""
+    raw = partial_json[match.end():]
+    index = 0
+    while index < len(raw):
+        if raw[index] == '\\':
+            index += 2
+            continue
+        if raw[index] == '"':
+            raw = raw[:index]
+            break
+        index += 1
+    # Drop an escape sequence that was cut off at the end of the stream
+    for cut in range(7):
+        try:
+            return json.loads('"' + raw[:len(raw) - cut] + '"')
+        except ValueError:
+            continue
+    return ""
+
+def resolve_structured_evaluation(raw_output, transcript_content):
+    """
+    Returns (summary_text, applicant_name, decision) from a structured evaluation.
+    Falls back to the separate name and decision calls when it can't be parsed.
+    """
+    evaluation = parse_structured_evaluation(raw_output)
+    if evaluation:
+        applicant_name = evaluation["applicant_name"]
+        if applicant_name == "Unknown_Applicant":
+            applicant_name = parse_applicant_name(transcript_content) or applicant_name
+        return evaluation["markdown"], applicant_name, evaluation["decision"]
+
+    summary_text = extract_partial_json_string(raw_output, "markdown") or raw_output
+    applicant_name = extract_applicant_name(transcript_content)
+    decision = get_decision(summary_text[len(summary_text) * 3 // 5:])
+    return summary_text, applicant_name, decision
+
+def parse_decision(evaluation_summary):
+    """
+    Reads ACCEPTED or REJECTED from the end of an evaluation summary. Returns None
+    when the summary doesn't state exactly one of them.
+    """
+    final_decision = re.findall(
+        r'(?:final\s+)?decision\W{0,10}(ACCEPTED|REJECTED)\b',
+        evaluation_summary or "",
+        re.IGNORECASE
+    )
+    if final_decision:
+        return final_decision[-1].upper()
+    if re.search(r'\bnot\s+(?:be\s+)?(?:ACCEPTED|REJECTED)\b', evaluation_summary or "", re.IGNORECASE):
+        return None
+    decisions = set(re.findall(r'\b(ACCEPTED|REJECTED)\b', evaluation_summary or ""))
+    if len(decisions) == 1:
+        return decisions.pop()
+    return None
+
+def get_decision(evaluation_summary):
+    decision = parse_decision(evaluation_summary)
+    if decision:
+        return decision
+
     decision = generate_response(
-        final_prompt, 
-        system_prompt="You must reply strictly with either ACCEPTED or REJECTED, and nothing else."
+        evaluation_summary, 
+        system_prompt="You must reply strictly with either ACCEPTED or REJECTED, and nothing else.",
+        instructions=get_prompt_text("get_decision_from_evaluation_summary"),
+        task="decision"
     )
 
     if len(decision) >= 9:
@@ -74,25 +692,92 @@ def get_decision(evaluation_summary):
     return decision
 
 def save_evaluation(data, markdown):
-    db.add_result(data['applicant_name'], markdown, data['created_at'], data['decision'])
-    return f"Evaluation saved successfully!"
+    """
+    Stores an evaluation and returns the ID of the new row.
+    """
+    return db.add_result(
+        data['applicant_name'], markdown, data['created_at'], data['decision'],
+        data.get('prompt_version') or get_prompt_version()
+    )
 
-def show_markdown(selected_row):
-    try:
-        if selected_row is None or selected_row.empty:
-            return "No row selected."
+def get_db_metrics():
+    return db.get_pool_metrics()
 
-        row_id = int(selected_row.iloc[0]["id"])
-        print(f"Row ID: {row_id}")
-    except Exception as e:
-        print("Error extracting ID:", e)
-        return "Failed to extract row ID."
+def get_route_metrics():
+    return router.metrics()
+
+def parse_date_range(date_from=None, date_to=None):
+    """
+    Turns an inclusive YYYY-MM-DD range into (created_from, created_before) for
+    the database filters. Raises ValueError for malformed dates.
+    """
+    created_from = datetime.strptime(date_from, "%Y-%m-%d").strftime("%Y-%m-%d") if date_from else None
+    created_before = None
+    if date_to:
+        created_before = (datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    return created_from, created_before
 
-    result = db.get_result(row_id)
-    return result[4] if result else "Result not found."
+def get_history_page(page=1, sort_by="ID", descending=True, name=None, decision=None, date_from=None, date_to=None):
+    """
+    Returns (dataframe, page, total_pages) for the history table. Dates are
+    YYYY-MM-DD strings and both ends of the range are inclusive.
+    """
+    created_from, created_before = parse_date_range(date_from, date_to)
+    filters = dict(
+        sort_by=sort_by,
+        descending=descending,
+        name=name or None,
+        decision=decision or None,
+        created_from=created_from,
+        created_before=created_before
+    )
+    df, total = db.get_page(page=page, page_size=HISTORY_PAGE_SIZE, **filters)
+    total_pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+    if page > total_pages:
+        page = total_pages
+        df, total = db.get_page(page=page, page_size=HISTORY_PAGE_SIZE, **filters)
+    return df, max(page, 1), total_pages
 
-def get_df():
-    return db.get_dataframe()
+def search_evaluations(text):
+    return db.search(text, limit=HISTORY_PAGE_SIZE)
 
 def get_result(result_id):
     return db.get_result(result_id)
+
+def get_result_markdown(result_id):
+    return db.get_markdown(result_id)
+
+def get_result_pdf(result_id):
+    """
+    Path of the PDF of a stored evaluation, rendered from its Markdown when it
+    is not cached. Returns None when the result does not exist.
+    """
+    from pdf_export import pdf_cache, pdf_filename
+
+    result = db.get_result(result_id)
+    if result is None:
+        return None
+    _, created_at, name, _, markdown = result
+    return pdf_cache.get(markdown, pdf_filename(name, created_at))
+
+def export_cohort(output_path, name=None, decision=None, date_from=None, date_to=None, merged=False, progress_callback=None):
+    """
+    Exports the PDFs of every evaluation matching the history filters into a ZIP
+    or, with merged, into one PDF with a table of contents. Returns the number
+    of evaluations exported.
+    """
+    from pdf_export import export_pdfs, pdf_filename
+
+    created_from, created_before = parse_date_range(date_from, date_to)
+    rows = db.get_filtered_results(name or None, decision or None, created_from, created_before)
+    evaluations = [
+        (
+            f"{applicant_name} ({result_decision or 'no decision'}), {created_at}",
+            pdf_filename(applicant_name, created_at),
+            db.get_markdown(result_id)
+        )
+        for result_id, created_at, applicant_name, result_decision in rows
+    ]
+    if evaluations:
+        export_pdfs(evaluations, output_path, merged=merged, progress_callback=progress_callback)
+    return len(evaluations)
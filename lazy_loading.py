@@ -0,0 +1,73 @@
+import threading
+
+class LazyObject:
+    """
+    Stands in for an object that is built on first attribute access, so importing
+    a module doesn't open databases or clients it may never use.
+    """
+    def __init__(self, factory, *args, **kwargs):
+        object.__setattr__(self, "_factory", lambda: factory(*args, **kwargs))
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _get_instance(self):
+        instance = object.__getattribute__(self, "_instance")
+        if instance is None:
+            with object.__getattribute__(self, "_lock"):
+                instance = object.__getattribute__(self, "_instance")
+                if instance is None:
+                    instance = object.__getattribute__(self, "_factory")()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self._get_instance(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get_instance(), name, value)
+
+class LazyMapping(dict):
+    """
+    Dict of the given keys whose values are built by factory(key) on first
+    lookup. Membership tests and iteration don't build anything.
+    """
+    def __init__(self, factory, keys):
+        super().__init__()
+        self._factory = factory
+        self._keys = list(dict.fromkeys(keys))
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def keys(self):
+        return list(self._keys)
+
+    def values(self):
+        return [self[key] for key in self._keys]
+
+    def items(self):
+        return [(key, self[key]) for key in self._keys]
+
+    def __missing__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        with self._lock:
+            if not dict.__contains__(self, key):
+                dict.__setitem__(self, key, self._factory(key))
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def loaded(self):
+        """
+        Keys whose values have been built so far.
+        """
+        return [key for key in self._keys if dict.__contains__(self, key)]
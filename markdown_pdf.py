@@ -1,6 +1,148 @@
 import re
 from fpdf import FPDF
 
+HEADING_PATTERN = re.compile(r"(#{1,6})\s+(.*)")
+BULLET_PATTERN = re.compile(r"[*+-]\s+(.*)")
+NUMBERED_PATTERN = re.compile(r"(\d+[.)])\s+(.*)")
+QUOTE_PATTERN = re.compile(r">\s?(.*)")
+RULE_PATTERN = re.compile(r"(?:-\s*){3,}|(?:\*\s*){3,}|(?:_\s*){3,}")
+TABLE_SEPARATOR_CELL = re.compile(r":?-+:?")
+STANDALONE_BOLD_PATTERN = re.compile(r"\*\*([^*]+)\*\*:?")
+# Groups: 1 bold italic, 2 and 3 bold, 4 italic, 5 inline code
+INLINE_PATTERN = re.compile(
+    r"\*\*\*(.+?)\*\*\*|\*\*(.+?)\*\*|__(.+?)__|(?<![\w*])\*(?![\s*])(.+?)(?<![\s*])\*(?!\w)|`([^`]+)`"
+)
+INLINE_STYLES = {1: "BI", 2: "B", 3: "B", 4: "I", 5: ""}
+
+# The core PDF fonts only cover latin-1; model output is full of typographic characters
+LATIN1_REPLACEMENTS = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "‛": "'",
+    "“": '"', "”": '"', "„": '"', "′": "'", "″": '"',
+    "–": "-", "—": "-", "―": "-", "−": "-", "‐": "-", "‑": "-",
+    "…": "...", "•": "-", "●": "-", "▪": "-", "‣": "-",
+    "→": "->", "←": "<-", "⇒": "=>", "≤": "<=", "≥": ">=", "≠": "!=",
+    "✓": "v", "✔": "v", "✗": "x", "✘": "x",
+    "\u2009": " ", "\u202f": " ", "\u200b": "", "\ufeff": ""
+})
+
+# (font size, line height, space before, space after) per heading level
+HEADING_STYLES = {
+    1: (18, 11, 5, 3),
+    2: (16, 10, 4, 2),
+    3: (14, 8, 3, 1),
+    4: (12, 8, 0, 1)
+}
+STANDALONE_BOLD_STYLE = (14, 10, 0, 2)
+BODY_SIZE = 12
+LINE_HEIGHT = 8
+TABLE_SIZE = 10
+TABLE_LINE_HEIGHT = 5
+LIST_INDENT = 6
+
+def to_latin1(text):
+    return text.translate(LATIN1_REPLACEMENTS).encode("latin-1", "replace").decode("latin-1")
+
+def parse_inline(text, base_style=""):
+    """
+    Splits a line into (font style, text) spans for **bold**, *italic*,
+    ***both*** and `code`, which is shown as plain text.
+    """
+    spans = []
+    position = 0
+    for match in INLINE_PATTERN.finditer(text):
+        if match.start() > position:
+            spans.append((base_style, text[position:match.start()]))
+        group = match.lastindex
+        style = "".join(sorted(set(base_style + INLINE_STYLES[group]), key="BI".index))
+        spans.append((style, match.group(group)))
+        position = match.end()
+    if position < len(text):
+        spans.append((base_style, text[position:]))
+    return spans
+
+def plain_text(text):
+    return "".join(span for _, span in parse_inline(text))
+
+def split_table_row(line):
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+def tokenize_markdown(text):
+    """
+    Turns Markdown into a flat list of blocks in one pass over the lines:
+    ("heading", level, text), ("strong", text), ("paragraph", spans),
+    ("list_item", depth, marker, spans), ("quote", spans), ("code", text),
+    ("table", rows), ("rule",) and ("blank",).
+    """
+    blocks = []
+    table_rows = []
+    code_lines = None
+
+    def flush_table():
+        if table_rows:
+            blocks.append(("table", list(table_rows)))
+            table_rows.clear()
+
+    for raw_line in to_latin1(text or "").strip().splitlines():
+        line = raw_line.strip()
+
+        if line.startswith("```"):
+            flush_table()
+            if code_lines is None:
+                code_lines = []
+            else:
+                blocks.append(("code", "\n".join(code_lines)))
+                code_lines = None
+            continue
+        if code_lines is not None:
+            code_lines.append(raw_line.rstrip())
+            continue
+
+        if line.startswith("|"):
+            cells = split_table_row(line)
+            if not all(TABLE_SEPARATOR_CELL.fullmatch(cell) for cell in cells if cell):
+                table_rows.append(cells)
+            continue
+        flush_table()
+
+        if not line:
+            if blocks and blocks[-1][0] != "blank":
+                blocks.append(("blank",))
+            continue
+
+        first = line[0]
+        if first == "#":
+            match = HEADING_PATTERN.match(line)
+            if match:
+                blocks.append(("heading", min(len(match.group(1)), 4), plain_text(match.group(2))))
+                continue
+        if first in "-*_" and RULE_PATTERN.fullmatch(line):
+            blocks.append(("rule",))
+            continue
+        if first in "*+-":
+            match = BULLET_PATTERN.match(line)
+            if match:
+                depth = (len(raw_line) - len(raw_line.lstrip())) // 2
+                blocks.append(("list_item", depth, "-", parse_inline(match.group(1))))
+                continue
+        if first.isdigit():
+            match = NUMBERED_PATTERN.match(line)
+            if match:
+                depth = (len(raw_line) - len(raw_line.lstrip())) // 2
+                blocks.append(("list_item", depth, match.group(1), parse_inline(match.group(2))))
+                continue
+        if first == ">":
+            blocks.append(("quote", parse_inline(QUOTE_PATTERN.match(line).group(1), "I")))
+            continue
+        if first == "*" and STANDALONE_BOLD_PATTERN.fullmatch(line):
+            blocks.append(("strong", STANDALONE_BOLD_PATTERN.fullmatch(line).group(1)))
+            continue
+        blocks.append(("paragraph", parse_inline(line)))
+
+    flush_table()
+    if code_lines:
+        blocks.append(("code", "\n".join(code_lines)))
+    return blocks
+
 class MarkdownPDF(FPDF):
     def __init__(self):
         super().__init__()
@@ -8,92 +150,149 @@ class MarkdownPDF(FPDF):
         self.set_left_margin(15)
         self.set_right_margin(15)
         self.add_page()
-        self.set_font("Helvetica", size=12)
+        self._font_state = None
+        self.use_font("Helvetica", "", BODY_SIZE)
+
+    def use_font(self, family, style, size):
+        # Most consecutive spans share a font, so skip set_font when nothing changes
+        state = (family, style, size)
+        if state != self._font_state:
+            self.set_font(family, style, size)
+            self._font_state = state
+
+    def write_spans(self, spans, size=BODY_SIZE, line_height=LINE_HEIGHT):
+        for style, text in spans:
+            self.use_font("Helvetica", style, size)
+            self.write(line_height, text)
+        self.ln(line_height)
 
-    def safe_multicell(self, text, style="", size=12, line_height=8):
-        self.set_font("Helvetica", style, size)
-        safe_width = self.w - 2 * self.l_margin
+    def render_heading(self, text, size, line_height, space_before, space_after):
+        self.use_font("Helvetica", "B", size)
+        if space_before:
+            self.ln(space_before)
+        self.multi_cell(0, line_height, text)
+        self.ln(space_after)
+
+    def render_indented(self, indent, marker, spans):
+        # Wrapped lines start at the left margin, so it moves in for a hanging indent
+        base_margin = self.l_margin
+        self.set_x(base_margin + indent)
+        if marker:
+            self.use_font("Helvetica", "", BODY_SIZE)
+            self.write(LINE_HEIGHT, marker + " ")
+        self.set_left_margin(self.get_x())
         try:
-            self.multi_cell(safe_width, line_height, text)
-        except Exception:
-            # Add soft breaks into long words if needed
-            safe_text = re.sub(r'(\S{60,})', lambda m: '\u200b'.join(m.group(0)), text)
-            self.multi_cell(safe_width, line_height, safe_text)
+            for style, text in spans:
+                self.use_font("Helvetica", style, BODY_SIZE)
+                self.write(LINE_HEIGHT, text)
+        finally:
+            self.set_left_margin(base_margin)
+        self.ln(LINE_HEIGHT + 1)
 
-    def render_markdown(self, text):
-        lines = text.strip().split('\n')
-        for line in lines:
-            line = line.strip()
-
-            # H2
-            if re.match(r"^##\s+", line):
-                heading = re.sub(r"^##\s+", "", line)
-                self.set_font("Helvetica", "B", 16)
-                self.ln(4)
-                self.multi_cell(0, 10, heading)
-                self.ln(2)
+    def wrap_text(self, text, width):
+        """
+        Breaks text into lines no wider than width in the current font, splitting
+        words that don't fit on a line of their own. Each word is measured once.
+        """
+        char_widths = self.current_font["cw"]
+        scale = self.font_size / 1000
 
-            # H3
-            elif re.match(r"^###\s+", line):
-                subheading = re.sub(r"^###\s+", "", line)
-                self.set_font("Helvetica", "B", 14)
-                self.ln(3)
-                self.multi_cell(0, 8, subheading)
-                self.ln(1)
+        def measure(part):
+            return sum(char_widths.get(char, 0) for char in part) * scale
 
-            # H4
-            elif re.match(r"^####\s+", line):
-                subsubheading = re.sub(r"^####\s+", "", line)
-                self.set_font("Helvetica", "B", 12)
-                self.multi_cell(0, 8, subsubheading)
-                self.ln(1)
+        space = measure(" ")
+        lines = []
+        for paragraph in text.split("\n"):
+            line, line_width = [], 0.0
+            for word in paragraph.split(" "):
+                word_width = measure(word)
+                if line and line_width + space + word_width <= width:
+                    line.append(word)
+                    line_width += space + word_width
+                    continue
+                if line:
+                    lines.append(" ".join(line))
+                while word_width > width and len(word) > 1:
+                    cut, cut_width = 0, 0.0
+                    while cut < len(word) - 1 and cut_width + char_widths.get(word[cut], 0) * scale <= width:
+                        cut_width += char_widths.get(word[cut], 0) * scale
+                        cut += 1
+                    cut = max(cut, 1)
+                    lines.append(word[:cut])
+                    word = word[cut:]
+                    word_width = measure(word)
+                line, line_width = [word], word_width
+            lines.append(" ".join(line))
+        return lines
 
-            elif re.match(r"(.+?)\*\*(.+?)\*\*(.*)", line):
-                match = re.match(r"(.+?)\*\*(.+?)\*\*(.*)", line)
-                before, bold_text, after = match.groups()
-                self.set_font("Helvetica", "", 12)
-                self.write(8, before)
-                self.set_font("Helvetica", "B", 12)
-                self.write(8, bold_text)
-                self.set_font("Helvetica", "", 12)
-                self.write(8, after + "\n")
-
-            # Bullet with bold label: * **Label:** content
-            elif re.match(r"^\*\s+\*\*(.+?)\*\*:\s*(.*)", line):
-                match = re.match(r"^\*\s+\*\*(.+?)\*\*:\s*(.*)", line)
-                label, value = match.groups()
-                self.set_font("Helvetica", "B", 12)
-                self.cell(self.get_string_width(f"- {label}: ") + 1, 8, f"- {label}:", ln=0)
-                self.set_font("Helvetica", "", 12)
-                self.multi_cell(0, 8, value)
-                self.ln(1)
+    def render_table(self, rows):
+        columns = max(len(row) for row in rows)
+        rows = [[plain_text(cell) for cell in row] + [""] * (columns - len(row)) for row in rows]
+        available = self.w - self.l_margin - self.r_margin
+        padding = 2 * self.c_margin
 
-            # Bold label only: **Label:** content
-            elif re.match(r"^\*\*(.+?)\*\*:\s*(.*)", line):
-                match = re.match(r"^\*\*(.+?)\*\*:\s*(.*)", line)
-                label, value = match.groups()
-                self.set_font("Helvetica", "B", 12)
-                self.cell(self.get_string_width(f"{label}: ") + 1, 8, f"{label}:", ln=0)
-                self.set_font("Helvetica", "", 12)
-                self.multi_cell(0, 8, value)
-                self.ln(1)
+        self.use_font("Helvetica", "B", TABLE_SIZE)
+        natural = [self.get_string_width(cell) + padding + 1 for cell in rows[0]]
+        self.use_font("Helvetica", "", TABLE_SIZE)
+        for row in rows[1:]:
+            natural = [max(width, self.get_string_width(cell) + padding + 1) for width, cell in zip(natural, row)]
+        if sum(natural) <= available:
+            widths = natural
+        else:
+            # Narrow columns keep their width and the wide ones share what is left
+            widths = [min(width, available / columns) for width in natural]
+            wide = [index for index, width in enumerate(natural) if width > available / columns]
+            spare = available - sum(widths)
+            wide_total = sum(natural[index] - widths[index] for index in wide) or 1
+            for index in wide:
+                widths[index] += spare * (natural[index] - widths[index]) / wide_total
 
-            # Bullet point (regular)
-            elif re.match(r"^\*\s+", line):
-                content = re.sub(r"^\*\s+", "- ", line)
-                self.set_font("Helvetica", "", 12)
-                self.multi_cell(0, 8, content)
-                self.ln(1)
+        self.ln(1)
+        for row_index, row in enumerate(rows):
+            style = "B" if row_index == 0 else ""
+            self.use_font("Helvetica", style, TABLE_SIZE)
+            cell_lines = [self.wrap_text(cell, width - padding) for cell, width in zip(row, widths)]
+            height = max(len(lines) for lines in cell_lines) * TABLE_LINE_HEIGHT
+            if self.get_y() + height > self.page_break_trigger:
+                self.add_page()
+                self.use_font("Helvetica", style, TABLE_SIZE)
+            x, y = self.l_margin, self.get_y()
+            for lines, width in zip(cell_lines, widths):
+                # Lines are already wrapped, so plain cells are enough
+                self.rect(x, y, width, height)
+                for line_index, line in enumerate(lines):
+                    self.set_xy(x, y + line_index * TABLE_LINE_HEIGHT)
+                    self.cell(width, TABLE_LINE_HEIGHT, line)
+                x += width
+            self.set_xy(self.l_margin, y + height)
+        self.ln(3)
 
-            # Standalone bold line (e.g. **Important**)
-            elif re.match(r"^\*\*(.+?)\*\*$", line):
-                heading = re.match(r"^\*\*(.+?)\*\*$", line).group(1)
-                self.set_font("Helvetica", "B", 14)
-                self.multi_cell(0, 10, heading)
+    def render_blocks(self, blocks):
+        for block in blocks:
+            kind = block[0]
+            if kind == "heading":
+                self.render_heading(block[2], *HEADING_STYLES[block[1]])
+            elif kind == "strong":
+                self.render_heading(block[1], *STANDALONE_BOLD_STYLE)
+            elif kind == "paragraph":
+                self.write_spans(block[1])
+                self.ln(1)
+            elif kind == "list_item":
+                self.render_indented(block[1] * LIST_INDENT, block[2], block[3])
+            elif kind == "quote":
+                self.render_indented(LIST_INDENT, "", block[1])
+            elif kind == "code":
+                self.use_font("Courier", "", TABLE_SIZE)
+                self.multi_cell(0, TABLE_LINE_HEIGHT, block[1])
                 self.ln(2)
+            elif kind == "table":
+                self.render_table(block[1])
+            elif kind == "rule":
+                self.ln(2)
+                self.line(self.l_margin, self.get_y(), self.w - self.r_margin, self.get_y())
+                self.ln(4)
+            elif kind == "blank":
+                self.ln(3)
 
-            # Default text
-            else:
-                self.set_font("Helvetica", "", 12)
-                self.multi_cell(0, 8, line)
-                self.ln(1)
+    def render_markdown(self, text):
+        self.render_blocks(tokenize_markdown(text))
@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from config import PDF_CACHE_DIR, PDF_CACHE_MAX_MB, PDF_WORKERS, PDF_EXPORT_WORKERS
+
+def render_pdf(text, full_path):
+    """
+    Renders Markdown text into a PDF at full_path, falling back to plain text
+    when the Markdown renderer fails.
+    """
+    # The PDF libraries are only needed once a PDF is made, so they load here
+    from fpdf import FPDF
+    from markdown_pdf import MarkdownPDF
+
+    try:
+        pdf = MarkdownPDF()
+        pdf.render_markdown(text)
+        pdf.output(full_path)
+    except Exception:
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_font("Arial", size=12)
+        # FPDF requires latin-1, so we encode and replace unknown characters
+        if text is not None:
+            encoded_text = text.encode('latin-1', 'replace').decode('latin-1')
+        else:
+            encoded_text = ""
+        for line in encoded_text.split('\n'):
+            pdf.multi_cell(0, 10, line)
+        pdf.output(full_path)
+    return full_path
+
+def pdf_filename(applicant_name, created_at):
+    name = re.sub(r'[^\w-]+', '_', applicant_name or "").strip('_') or "Unknown_Applicant"
+    timestamp = re.sub(r'[^\w-]+', '_', created_at or "").strip('_')
+    return f"{name}_Evaluation_{timestamp}.pdf" if timestamp else f"{name}_Evaluation.pdf"
+
+class PDFCache:
+    """
+    Renders evaluation PDFs on a small background pool and keeps them under
+    directory/<hash of the Markdown>/<filename>, so a PDF is rendered once per
+    evaluation text no matter how often it is downloaded. Entries are touched on
+    use and the least recently used ones are deleted when the directory grows
+    past max_bytes; they are simply rendered again when asked for.
+    """
+    def __init__(self, directory, max_bytes, workers=1):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pdf-render")
+            return self._executor
+
+    def path_for(self, markdown, filename):
+        key = hashlib.sha256((markdown or "").encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, key, filename)
+
+    def lookup(self, markdown, filename):
+        """
+        Path of the cached PDF, or None when it has not been rendered yet.
+        """
+        path = self.path_for(markdown, filename)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(os.path.dirname(path))
+        except OSError:
+            pass
+        return path
+
+    def submit(self, markdown, filename):
+        """
+        Queues a PDF for rendering and returns a Future with its path. Cached
+        PDFs resolve at once and a PDF that is already queued is not queued twice.
+        """
+        path = self.lookup(markdown, filename)
+        if path is not None:
+            future = Future()
+            future.set_result(path)
+            return future
+        path = self.path_for(markdown, filename)
+        executor = self._get_executor()
+        with self._lock:
+            future = self._pending.get(path)
+            if future is None:
+                future = self._pending[path] = executor.submit(self._render, markdown, path)
+        return future
+
+    def get(self, markdown, filename):
+        """
+        Path of the PDF, rendering it first if needed.
+        """
+        return self.submit(markdown, filename).result()
+
+    def _render(self, markdown, path):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Render next to the target so nobody picks up a half-written file
+            partial_path = f"{path}.{threading.get_ident()}.part"
+            render_pdf(markdown, partial_path)
+            os.replace(partial_path, path)
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+        try:
+            self.evict()
+        except OSError as e:
+            print(f"Could not clean up {self.directory}: {e}")
+        return path
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the directory fits in
+        max_bytes. Files left there by older versions count as entries too.
+        """
+        if not self.max_bytes or not os.path.isdir(self.directory):
+            return
+        with self._lock:
+            busy = {os.path.dirname(path) for path in self._pending}
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                size = sum(file.stat().st_size for file in os.scandir(entry.path) if file.is_file())
+            else:
+                size = entry.stat().st_size
+            entries.append((entry.stat().st_mtime, entry.path, entry.is_dir(), size))
+        total = sum(size for _, _, _, size in entries)
+        # Entries used in the last minute are kept even if they alone exceed the limit
+        recent = time.time() - 60
+        for mtime, path, is_dir, size in sorted(entries):
+            if total <= self.max_bytes or mtime >= recent:
+                break
+            if path in busy:
+                continue
+            if is_dir:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+            total -= size
+
+pdf_cache = PDFCache(PDF_CACHE_DIR, PDF_CACHE_MAX_MB * 1024 * 1024, PDF_WORKERS)
+
+def render_cached_pdf(markdown, path):
+    """
+    Returns the bytes of the PDF at path, rendering it there first if it is not
+    cached yet. Runs in the export worker processes.
+    """
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        # Not rendered yet, or evicted by the app's cache in the meantime
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = f"{path}.{os.getpid()}.part"
+    render_pdf(markdown, partial_path)
+    with open(partial_path, 'rb') as file:
+        content = file.read()
+    os.replace(partial_path, path)
+    return content
+
+def build_contents_markdown(titles, first_pages):
+    lines = ["# Table of Contents", "", "| # | Evaluation | Page |", "|---|---|---|"]
+    for index, (title, page) in enumerate(zip(titles, first_pages), start=1):
+        lines.append(f"| {index} | {title} | {page} |")
+    return "\n".join(lines)
+
+def export_pdfs(evaluations, output_path, merged=False, workers=PDF_EXPORT_WORKERS, progress_callback=None):
+    """
+    Renders (title, filename, markdown) evaluations in a process pool, since
+    rendering is CPU-bound, and writes them into a ZIP as they finish. With
+    merged, they are combined in order into one PDF that starts with a table of
+    contents and has a bookmark per evaluation. progress_callback(done, total) is called
+    after every rendered PDF.
+    """
+    total = len(evaluations)
+    workers = min(workers or os.cpu_count() or 1, total) or 1
+    done = 0
+    # Forking a process that runs Gradio's and the render pool's threads can copy held locks
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {
+            executor.submit(render_cached_pdf, markdown, pdf_cache.path_for(markdown, filename)): index
+            for index, (_, filename, markdown) in enumerate(evaluations)
+        }
+        if not merged:
+            width = len(str(total))
+            with zipfile.ZipFile(output_path, "w", zipfile.ZIP_STORED) as archive:
+                for future in as_completed(futures):
+                    index = futures[future]
+                    # Numbered so names stay unique and sort in export order
+                    archive.writestr(f"{index + 1:0{width}d}_{evaluations[index][1]}", future.result())
+                    done += 1
+                    if progress_callback:
+                        progress_callback(done, total)
+        else:
+            import fitz
+
+            merged_doc = fitz.open()
+            first_pages = []
+            finished = {}
+            for future in as_completed(futures):
+                finished[futures[future]] = future.result()
+                # Append in export order as soon as the next evaluation is ready
+                while len(first_pages) in finished:
+                    with fitz.open("pdf", finished.pop(len(first_pages))) as doc:
+                        first_pages.append(merged_doc.page_count)
+                        merged_doc.insert_pdf(doc)
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total)
+            merge_with_contents(merged_doc, [title for title, _, _ in evaluations], first_pages, output_path)
+    pdf_cache.evict()
+    return output_path
+
+def merge_with_contents(merged_doc, titles, first_pages, output_path):
+    import fitz
+
+    # The page numbers depend on how many pages the contents take up
+    contents_pages = 1
+    with tempfile.TemporaryDirectory() as directory:
+        contents_path = os.path.join(directory, "contents.pdf")
+        while True:
+            render_pdf(build_contents_markdown(titles, [contents_pages + page + 1 for page in first_pages]), contents_path)
+            contents_doc = fitz.open(contents_path)
+            if contents_doc.page_count == contents_pages:
+                break
+            contents_pages = contents_doc.page_count
+            contents_doc.close()
+        merged_doc.insert_pdf(contents_doc, start_at=0)
+        contents_doc.close()
+    merged_doc.set_toc(
+        [[1, "Table of Contents", 1]] + [[1, title, contents_pages + page + 1] for title, page in zip(titles, first_pages)]
+    )
+    merged_doc.save(output_path, garbage=3, deflate=True)
+    merged_doc.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the evaluation PDFs of a cohort into a ZIP or one merged PDF.")
+    parser.add_argument("output", help="Output file; a .pdf name creates one merged PDF with a table of contents, anything else a ZIP")
+    parser.add_argument("--name", default=None, help="Only applicants whose name starts with this text")
+    parser.add_argument("--decision", choices=["ACCEPTED", "REJECTED"], default=None, help="Only evaluations with this decision")
+    parser.add_argument("--from", dest="date_from", default=None, metavar="YYYY-MM-DD", help="First day of the date range")
+    parser.add_argument("--to", dest="date_to", default=None, metavar="YYYY-MM-DD", help="Last day of the date range")
+    args = parser.parse_args()
+
+    from helpers import export_cohort
+
+    def print_progress(done, total):
+        print(f"Rendered {done}/{total} evaluations", end="\r" if done < total else "\n", flush=True)
+
+    count = export_cohort(
+        args.output,
+        name=args.name,
+        decision=args.decision,
+        date_from=args.date_from,
+        date_to=args.date_to,
+        merged=args.output.lower().endswith(".pdf"),
+        progress_callback=print_progress
+    )
+    print(f"Exported {count} evaluations to {args.output}" if count else "No evaluations match the filters.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import threading
+
+# Section headers the prompt files use for readability; they are not sent to the model
+PROMPT_SECTION_HEADERS = [
+    "[ PROFILE ]",
+    "[ DIRECTIVE ]",
+    "[ CONTEXT ]",
+    "[ WORKFLOW ]",
+    "[ CONSTRAINT ]",
+    "[ OUTPUT STYLE ]",
+    "[ EXAMPLE ]"
+]
+
+def normalize_prompt(content):
+    for header in PROMPT_SECTION_HEADERS:
+        content = content.replace(header, "")
+    return content.replace("\n", "")
+
+class PromptRegistry:
+    """
+    Loads and normalizes prompt files once and serves them from memory. A file is
+    only re-read when its mtime or size changes, so edited prompts are picked up
+    without a restart.
+
+    Prompts are looked up by name ("transcript_parsing_prompt") or by path. When a
+    prompt set is given, files in directory/prompt_set override the ones in
+    directory, which lets several prompt versions live side by side.
+    """
+    def __init__(self, directory="prompt_text", prompt_set=None):
+        self.directory = directory
+        self.prompt_set = prompt_set or None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name):
+        if name.endswith(".txt") or os.sep in name or "/" in name:
+            file_name = os.path.basename(name)
+            fallback = name
+        else:
+            file_name = f"{name}.txt"
+            fallback = os.path.join(self.directory, file_name)
+        if self.prompt_set:
+            override = os.path.join(self.directory, self.prompt_set, file_name)
+            if os.path.exists(override):
+                return override
+        return fallback
+
+    def _load(self, name):
+        path = self.resolve(name)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry
+        with open(path, 'r', encoding='utf-8') as file:
+            text = normalize_prompt(file.read())
+        entry = (signature, text, hashlib.sha256(text.encode('utf-8')).hexdigest())
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+    def get(self, name):
+        return self._load(name)[1]
+
+    def hash(self, name):
+        return self._load(name)[2]
+
+    def names(self):
+        names = {file[:-4] for file in os.listdir(self.directory) if file.endswith(".txt")}
+        if self.prompt_set:
+            set_directory = os.path.join(self.directory, self.prompt_set)
+            names |= {file[:-4] for file in os.listdir(set_directory) if file.endswith(".txt")}
+        return sorted(names)
+
+    def version(self, names=None):
+        """
+        Short hash identifying the current content of the given prompts (all of
+        them by default). Stored with each evaluation so results can be traced
+        back to the exact prompts that produced them.
+        """
+        sha = hashlib.sha256()
+        for name in sorted(names or self.names()):
+            sha.update(f"{name}:{self.hash(name)}\n".encode('utf-8'))
+        return sha.hexdigest()[:12]
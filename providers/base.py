@@ -1,3 +1,5 @@
+import asyncio
+
 class GenAIProvider:
     def upload_file_to_model(
         self,
@@ -5,6 +7,63 @@ class GenAIProvider:
     ):
         raise NotImplementedError("Subclasses must implement upload_file_to_model()")
         
+    def describe_uploaded_file(
+        self,
+        file
+    ) -> dict:
+        """
+        Returns remote_id, uri, mime_type and expires_at (epoch seconds, or None if
+        the provider keeps files until deleted) for a handle from upload_file_to_model.
+        """
+        raise NotImplementedError("Subclasses must implement describe_uploaded_file()")
+
+    def file_from_record(
+        self,
+        record: dict
+    ):
+        """
+        Rebuilds a handle usable in generate_text contents from describe_uploaded_file output.
+        """
+        raise NotImplementedError("Subclasses must implement file_from_record()")
+
+    def delete_uploaded_file(
+        self,
+        remote_id: str
+    ):
+        raise NotImplementedError("Subclasses must implement delete_uploaded_file()")
+
+    def count_tokens(
+        self,
+        model: str,
+        text: str
+    ) -> int:
+        """
+        Local estimate of the number of input tokens in text, without an API call.
+        """
+        # Roughly four characters per token for English prose
+        return (len(text or "") + 3) // 4
+
+    def classify_error(
+        self,
+        error: Exception
+    ):
+        """
+        Returns "rate_limit" for errors caused by request or quota limits that will
+        pass, "transient" for other errors worth retrying and None otherwise.
+        """
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return "transient"
+        return None
+
+    def get_retry_after(
+        self,
+        error: Exception
+    ):
+        """
+        Seconds the provider asked to wait before retrying, if it said so.
+        """
+        return None
+
     def generate_text(
         self, 
         model: str, 
@@ -12,6 +71,99 @@ class GenAIProvider:
         system_prompt:str, 
         temperature: float = 0.5, 
         max_tokens: int = 5000,
-        contents: list = []
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ) -> str:
+        """
+        When response_schema (a JSON schema) is given, the reply is a JSON document following it.
+        instructions is static text sent ahead of contents and prompt. It is the same
+        across requests, so providers mark it for their prompt cache where they can.
+        """
+        raise NotImplementedError("Subclasses must implement generate_text()")
+
+    async def aupload_file(
+        self,
+        file_path
+    ):
+        # Fallback for providers without a native async client
+        return await asyncio.to_thread(self.upload_file_to_model, file_path)
+
+    async def agenerate_text(
+        self, 
+        model: str, 
+        prompt: str, 
+        system_prompt:str, 
+        temperature: float = 0.5, 
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
     ) -> str:
-        raise NotImplementedError("Subclasses must implement generate_text()")
\ No newline at end of file
+        # Fallback for providers without a native async client
+        return await asyncio.to_thread(
+            self.generate_text, model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions
+        )
+
+    def generate_text_stream(
+        self, 
+        model: str, 
+        prompt: str, 
+        system_prompt:str, 
+        temperature: float = 0.5, 
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ):
+        """
+        Yields the generated text in chunks as it arrives. Providers without
+        streaming support yield the full text once.
+        """
+        yield self.generate_text(model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions)
+
+    async def agenerate_text_stream(
+        self, 
+        model: str, 
+        prompt: str, 
+        system_prompt:str, 
+        temperature: float = 0.5, 
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ):
+        yield await self.agenerate_text(model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions)
+
+    def submit_batch(
+        self,
+        model: str,
+        requests: list
+    ) -> str:
+        """
+        Submits text generation requests to the vendor's asynchronous batch endpoint.
+        Each request is a dict with custom_id, prompt, system_prompt, temperature and max_tokens,
+        and optionally instructions and response_schema.
+        Returns the vendor's batch ID.
+        """
+        raise NotImplementedError("Subclasses must implement submit_batch()")
+
+    def get_batch_status(
+        self,
+        batch_id: str
+    ) -> str:
+        """
+        Returns "running", "completed" or "failed".
+        """
+        raise NotImplementedError("Subclasses must implement get_batch_status()")
+
+    def get_batch_results(
+        self,
+        batch_id: str,
+        custom_ids: list
+    ) -> dict:
+        """
+        Returns the generated text of a completed batch keyed by custom_id.
+        custom_ids must be in the order the requests were submitted.
+        """
+        raise NotImplementedError("Subclasses must implement get_batch_results()")
@@ -1,12 +1,24 @@
 from .base import GenAIProvider
 from google import genai
-from google.genai import types
+from google.genai import errors, types
+import asyncio
+import hashlib
+import httpx
+import threading
+import time
+
+# Refresh a cached context this long before it expires so requests never race its deletion
+CACHE_REFRESH_MARGIN_SECONDS = 5 * 60
 
 class GoogleProvider(GenAIProvider):
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache_ttl_seconds: int = 3600):
         self.client = genai.Client(
             api_key=api_key,
         )
+        self.cache_ttl_seconds = cache_ttl_seconds
+        # (model, prefix hash) -> (cached content name or None if the prefix can't be cached, expires_at)
+        self._cached_contents = {}
+        self._cache_lock = threading.Lock()
 
     def upload_file_to_model(
         self,
@@ -15,6 +27,155 @@ class GoogleProvider(GenAIProvider):
         file = self.client.files.upload(file=file_path)
         return file
 
+    async def aupload_file(
+        self,
+        file_path
+    ):
+        file = await self.client.aio.files.upload(file=file_path)
+        return file
+
+    def describe_uploaded_file(
+        self,
+        file
+    ) -> dict:
+        return {
+            "remote_id": file.name,
+            "uri": file.uri,
+            "mime_type": file.mime_type,
+            "expires_at": file.expiration_time.timestamp() if file.expiration_time else None
+        }
+
+    def file_from_record(
+        self,
+        record: dict
+    ):
+        return types.Part.from_uri(file_uri=record["uri"], mime_type=record["mime_type"])
+
+    def delete_uploaded_file(
+        self,
+        remote_id: str
+    ):
+        self.client.files.delete(name=remote_id)
+
+    def classify_error(
+        self,
+        error: Exception
+    ):
+        if isinstance(error, errors.APIError):
+            if error.code == 429:
+                return "rate_limit"
+            if error.code in (408, 500, 502, 503, 504):
+                return "transient"
+            return None
+        if isinstance(error, (httpx.TimeoutException, httpx.NetworkError)):
+            return "transient"
+        return super().classify_error(error)
+
+    def get_retry_after(
+        self,
+        error: Exception
+    ):
+        # Quota errors carry a google.rpc.RetryInfo detail such as {"retryDelay": "31s"}
+        details = getattr(error, "details", None)
+        if not isinstance(details, dict):
+            return None
+        for detail in details.get("error", {}).get("details", []):
+            delay = str(detail.get("retryDelay", ""))
+            if delay.endswith("s"):
+                try:
+                    return float(delay[:-1])
+                except ValueError:
+                    return None
+        return None
+
+    def _cache_key(self, model, system_prompt, instructions):
+        return model, hashlib.sha256(f"{system_prompt}|{instructions}".encode("utf-8")).hexdigest()
+
+    def _valid_cached_content(self, key):
+        entry = self._cached_contents.get(key)
+        if entry and entry[1] - time.time() > min(CACHE_REFRESH_MARGIN_SECONDS, self.cache_ttl_seconds / 2):
+            return entry
+        return None
+
+    def _get_cached_content(self, model, system_prompt, instructions):
+        """
+        Returns the name of a context cache holding the system prompt and the static
+        instructions, creating or extending it as needed. Returns None when the
+        prefix can't be cached, e.g. because it is below the model's minimum size;
+        such prefixes are not retried until a TTL has passed.
+        """
+        if not instructions or not self.cache_ttl_seconds:
+            return None
+        key = self._cache_key(model, system_prompt, instructions)
+        with self._cache_lock:
+            entry = self._valid_cached_content(key)
+            if entry:
+                return entry[0]
+            ttl = f"{self.cache_ttl_seconds}s"
+            expires_at = time.time() + self.cache_ttl_seconds
+            previous = self._cached_contents.get(key)
+            name = None
+            if previous and previous[0]:
+                try:
+                    name = self.client.caches.update(
+                        name=previous[0],
+                        config=types.UpdateCachedContentConfig(ttl=ttl)
+                    ).name
+                except Exception as e:
+                    print(f"Could not extend context cache {previous[0]}: {e}")
+            if name is None:
+                try:
+                    name = self.client.caches.create(
+                        model=model,
+                        config=types.CreateCachedContentConfig(
+                            display_name="static-instructions",
+                            system_instruction=system_prompt,
+                            contents=[instructions],
+                            ttl=ttl
+                        )
+                    ).name
+                except Exception as e:
+                    print(f"Context caching is not available for this prompt: {e}")
+            self._cached_contents[key] = (name, expires_at)
+            return name
+
+    async def _aget_cached_content(self, model, system_prompt, instructions):
+        if not instructions or not self.cache_ttl_seconds:
+            return None
+        entry = self._valid_cached_content(self._cache_key(model, system_prompt, instructions))
+        if entry:
+            return entry[0]
+        # Creating a cache is rare; doing it in a thread keeps one creation per prefix across tasks
+        return await asyncio.to_thread(self._get_cached_content, model, system_prompt, instructions)
+
+    def _build_contents(self, prompt, contents, instructions, cached_content):
+        # Copy so the shared default list is never mutated between calls
+        contents = list(contents) + [prompt]
+        if instructions and not cached_content:
+            contents.insert(0, instructions)
+        return contents
+
+    def _build_config(self, system_prompt, temperature, max_tokens, response_schema=None, cached_content=None):
+        config = types.GenerateContentConfig(
+            system_instruction=None if cached_content else system_prompt,
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            cached_content=cached_content
+        )
+        if response_schema:
+            config.response_mime_type = "application/json"
+            config.response_schema = self._to_gemini_schema(response_schema)
+        return config
+
+    def _to_gemini_schema(self, schema):
+        # Gemini rejects additionalProperties and needs an explicit order to emit fields as declared
+        gemini_schema = {key: value for key, value in schema.items() if key != "additionalProperties"}
+        if "properties" in gemini_schema:
+            gemini_schema["properties"] = {
+                name: self._to_gemini_schema(value) for name, value in gemini_schema["properties"].items()
+            }
+            gemini_schema["property_ordering"] = list(gemini_schema["properties"])
+        return gemini_schema
 
     def generate_text(
         self, 
@@ -23,19 +184,125 @@ class GoogleProvider(GenAIProvider):
         system_prompt: str, 
         temperature: float = 0.5, 
         max_tokens: int = 5000,
-        contents: list = []
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
     ) -> str:
-        contents.append(prompt)
-        try:
-            response = self.client.models.generate_content(
-                model=model,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    temperature=temperature,
-                    max_output_tokens=max_tokens
-                ),
-                contents=contents
-            )
-            return response.text
-        except:
-            return "Unable to generate text/content because the given API KEY is not active"
+        cached_content = self._get_cached_content(model, system_prompt, instructions)
+        response = self.client.models.generate_content(
+            model=model,
+            config=self._build_config(system_prompt, temperature, max_tokens, response_schema, cached_content),
+            contents=self._build_contents(prompt, contents, instructions, cached_content)
+        )
+        return response.text
+
+    async def agenerate_text(
+        self, 
+        model: str, 
+        prompt: str, 
+        system_prompt: str, 
+        temperature: float = 0.5, 
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ) -> str:
+        cached_content = await self._aget_cached_content(model, system_prompt, instructions)
+        response = await self.client.aio.models.generate_content(
+            model=model,
+            config=self._build_config(system_prompt, temperature, max_tokens, response_schema, cached_content),
+            contents=self._build_contents(prompt, contents, instructions, cached_content)
+        )
+        return response.text
+
+    def generate_text_stream(
+        self, 
+        model: str, 
+        prompt: str, 
+        system_prompt: str, 
+        temperature: float = 0.5, 
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ):
+        cached_content = self._get_cached_content(model, system_prompt, instructions)
+        for chunk in self.client.models.generate_content_stream(
+            model=model,
+            config=self._build_config(system_prompt, temperature, max_tokens, response_schema, cached_content),
+            contents=self._build_contents(prompt, contents, instructions, cached_content)
+        ):
+            if chunk.text:
+                yield chunk.text
+
+    async def agenerate_text_stream(
+        self, 
+        model: str, 
+        prompt: str, 
+        system_prompt: str, 
+        temperature: float = 0.5, 
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ):
+        cached_content = await self._aget_cached_content(model, system_prompt, instructions)
+        async for chunk in await self.client.aio.models.generate_content_stream(
+            model=model,
+            config=self._build_config(system_prompt, temperature, max_tokens, response_schema, cached_content),
+            contents=self._build_contents(prompt, contents, instructions, cached_content)
+        ):
+            if chunk.text:
+                yield chunk.text
+
+    def submit_batch(
+        self,
+        model: str,
+        requests: list
+    ) -> str:
+        inlined_requests = [
+            {
+                "contents": [{
+                    "role": "user",
+                    "parts": [{"text": text} for text in (request.get("instructions"), request["prompt"]) if text]
+                }],
+                "config": {
+                    "system_instruction": request["system_prompt"],
+                    "temperature": request.get("temperature", 0.5),
+                    "max_output_tokens": request.get("max_tokens", 5000),
+                    **({
+                        "response_mime_type": "application/json",
+                        "response_schema": self._to_gemini_schema(request["response_schema"])
+                    } if request.get("response_schema") else {})
+                }
+            }
+            for request in requests
+        ]
+        job = self.client.batches.create(model=model, src=inlined_requests)
+        return job.name
+
+    def get_batch_status(
+        self,
+        batch_id: str
+    ) -> str:
+        state = self.client.batches.get(name=batch_id).state.name
+        if state == "JOB_STATE_SUCCEEDED":
+            return "completed"
+        if state in ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"):
+            return "failed"
+        return "running"
+
+    def get_batch_results(
+        self,
+        batch_id: str,
+        custom_ids: list
+    ) -> dict:
+        job = self.client.batches.get(name=batch_id)
+        if not job.dest or not job.dest.inlined_responses:
+            return {}
+        # Inlined responses come back in request order
+        results = {}
+        for custom_id, inlined_response in zip(custom_ids, job.dest.inlined_responses):
+            if inlined_response.response is not None:
+                results[custom_id] = inlined_response.response.text
+        return results
@@ -0,0 +1,241 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from .throttled_provider import limit_retries
+
+class RouteStats:
+    """
+    Latency and error history of one provider and model. Latency is the time to
+    the full reply, or to the first chunk for streamed calls.
+    """
+    def __init__(self, window=100, alpha=0.2):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_success(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+            self.latency = seconds if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * seconds
+            self.error_rate *= 1 - self.alpha
+
+    def record_error(self):
+        with self._lock:
+            self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha
+
+    def percentile(self, fraction, min_samples=10):
+        with self._lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "latency": round(self.latency, 2) if self.latency is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                "samples": len(self.samples),
+            }
+
+class Route:
+    def __init__(self, provider_name, model):
+        self.provider_name = provider_name
+        self.model = model
+        self.stats = RouteStats()
+
+    def __repr__(self):
+        return f"{self.provider_name}:{self.model}"
+
+class ModelRouter:
+    """
+    Sends each call to the best of the provider and model routes configured for
+    its task ("parse_essay", "evaluate", "name", "decision", ...), falling back to the
+    next route when a call fails. routes maps tasks to lists of (provider name,
+    model); tasks without an entry use routes["default"].
+
+    Routes are tried in configured order until their measured latency and error
+    rate say otherwise. A route that hasn't been measured is assumed as fast as
+    the first route, so a failing first route hands traffic to it. Calls that
+    send uploaded files only go to the provider holding the files. While another
+    route is left, ThrottledProvider retries a call at most failover_retries
+    times, so a rate-limited route hands over instead of backing off.
+
+    For the tasks in hedged_tasks, async calls start a second request on the
+    next route when the first hasn't answered within its p95 latency, and use
+    whichever answers first. "parse" in hedged_tasks covers every parse_* task.
+    """
+    def __init__(self, providers, routes, files_provider, hedged_tasks=(), error_penalty=4.0, failover_retries=0):
+        self.providers = providers
+        self.failover_retries = failover_retries
+        self.configured_routes = routes
+        self.files_provider = files_provider
+        self.hedged_tasks = set(hedged_tasks)
+        self.error_penalty = error_penalty
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def _task_routes(self, task):
+        # Every task keeps its own history, since parsing and evaluating take very different times
+        with self._lock:
+            if task not in self._routes:
+                self._routes[task] = [
+                    Route(provider_name, model)
+                    for provider_name, model in self.configured_routes.get(task, self.configured_routes["default"])
+                    if provider_name in self.providers
+                ]
+            return self._routes[task]
+
+    def routes_for(self, task, contents=()):
+        routes = self._task_routes(task)
+        if contents:
+            # Files only exist where they were uploaded; use that provider's default route if the task has none there
+            routes = [route for route in routes if route.provider_name == self.files_provider] or [
+                route for route in self._task_routes("default") if route.provider_name == self.files_provider
+            ]
+            if not routes:
+                raise ValueError(f"No route for task {task} uses {self.files_provider}, which holds the uploaded files")
+        baseline = routes[0].stats.latency or 0.0
+
+        def score(route):
+            latency = route.stats.latency if route.stats.latency is not None else baseline
+            return latency * (1 + self.error_penalty * route.stats.error_rate) + route.stats.error_rate
+
+        return sorted(routes, key=score)
+
+    def metrics(self):
+        with self._lock:
+            routes = dict(self._routes)
+        return {
+            task: {repr(route): route.stats.snapshot() for route in task_routes}
+            for task, task_routes in routes.items()
+        }
+
+    def _is_hedged(self, task):
+        return task in self.hedged_tasks or task.split("_")[0] in self.hedged_tasks
+
+    def _hedge_delay(self, task, routes):
+        if not self._is_hedged(task) or len(routes) < 2:
+            return None
+        return routes[0].stats.percentile(0.95)
+
+    def generate_text(self, task, prompt, system_prompt, temperature=0.5, max_tokens=5000, contents=[], response_schema=None, instructions=None):
+        routes = self.routes_for(task, contents)
+        for index, route in enumerate(routes):
+            start = time.monotonic()
+            try:
+                with limit_retries(self._retries(index < len(routes) - 1)):
+                    result = self.providers[route.provider_name].generate_text(
+                        route.model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions
+                    )
+            except Exception as e:
+                route.stats.record_error()
+                if index == len(routes) - 1:
+                    raise
+                print(f"{route} failed for {task} ({e}), trying {routes[index + 1]}")
+                continue
+            route.stats.record_success(time.monotonic() - start)
+            return result
+
+    def _retries(self, has_fallback):
+        # A route with another one behind it gives up early instead of backing off for minutes
+        return self.failover_retries if has_fallback else None
+
+    async def _acall(self, route, call, has_fallback):
+        start = time.monotonic()
+        try:
+            with limit_retries(self._retries(has_fallback)):
+                result = await call(route)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            route.stats.record_error()
+            raise
+        route.stats.record_success(time.monotonic() - start)
+        return result
+
+    async def _ahedged(self, task, routes, call, tried, discard=None):
+        """
+        Runs call(route) on the first route and, if it is slower than its p95,
+        also on the second one. Returns the first successful result and cancels
+        the other request. The routes it calls are appended to tried, and
+        discard(result) is awaited for a result that finished too but lost.
+        """
+        delay = self._hedge_delay(task, routes)
+        tried.append(routes[0])
+        first = asyncio.ensure_future(self._acall(routes[0], call, len(routes) > 1))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done or delay is None:
+            return await first
+
+        print(f"{routes[0]} is slower than {delay:.1f}s for {task}, hedging with {routes[1]}")
+        tried.append(routes[1])
+        second = asyncio.ensure_future(self._acall(routes[1], call, len(routes) > 2))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Both can finish in the same round; the first route wins and the other is discarded
+                succeeded = [request for request in (first, second) if request in done and request.exception() is None]
+                if succeeded:
+                    for loser in succeeded[1:]:
+                        if discard is not None:
+                            await discard(loser.result())
+                    return succeeded[0].result()
+                error = next(iter(done)).exception()
+            raise error
+        finally:
+            for request in pending:
+                request.cancel()
+
+    async def _afailover(self, task, routes, call, discard=None):
+        tried = []
+        while True:
+            # A hedged attempt may already have used (and lost) the next route
+            remaining = [route for route in routes if route not in tried]
+            try:
+                return await self._ahedged(task, remaining, call, tried, discard)
+            except Exception as e:
+                remaining = [route for route in routes if route not in tried]
+                if not remaining:
+                    raise
+                print(f"{tried[-1]} failed for {task} ({e}), trying {remaining[0]}")
+
+    async def agenerate_text(self, task, prompt, system_prompt, temperature=0.5, max_tokens=5000, contents=[], response_schema=None, instructions=None):
+        async def call(route):
+            return await self.providers[route.provider_name].agenerate_text(
+                route.model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions
+            )
+        return await self._afailover(task, self.routes_for(task, contents), call)
+
+    async def agenerate_text_stream(self, task, prompt, system_prompt, temperature=0.5, max_tokens=5000, contents=[], response_schema=None, instructions=None):
+        # Routing and hedging decide on the first chunk; the rest comes from the winning stream
+        async def call(route):
+            stream = self.providers[route.provider_name].agenerate_text_stream(
+                route.model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions
+            )
+            try:
+                return await stream.__anext__(), stream
+            except StopAsyncIteration:
+                return None, stream
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        async def close(result):
+            await result[1].aclose()
+
+        first_chunk, stream = await self._afailover(task, self.routes_for(task, contents), call, discard=close)
+        if first_chunk is None:
+            return
+        yield first_chunk
+        async for chunk in stream:
+            yield chunk
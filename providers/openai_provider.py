@@ -1,21 +1,146 @@
 from .base import GenAIProvider
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient, NOT_GIVEN
+import openai
+import hashlib
+import httpx
+import json
+
+try:
+    import tiktoken
+except ImportError:
+    # Token counts fall back to the base class estimate
+    tiktoken = None
 
 class OpenAIProvider(GenAIProvider):
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_connections: int = 20):
+        # Retries are left to ThrottledProvider so they are counted against the shared limits
         self.client = OpenAI(
             api_key=api_key,
+            max_retries=0
+        )
+        # One pooled async client shared by every awaiting request
+        self.async_client = AsyncOpenAI(
+            api_key=api_key,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections
+                )
+            )
         )
+        self._encodings = {}
+
+    def count_tokens(
+        self,
+        model: str,
+        text: str
+    ) -> int:
+        if tiktoken is None:
+            return super().count_tokens(model, text)
+        if model not in self._encodings:
+            try:
+                self._encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encodings[model] = tiktoken.get_encoding("o200k_base")
+        return len(self._encodings[model].encode(text or "", disallowed_special=()))
+
+    def classify_error(
+        self,
+        error: Exception
+    ):
+        if isinstance(error, openai.RateLimitError):
+            # An exhausted quota won't come back by waiting
+            return None if getattr(error, "code", None) == "insufficient_quota" else "rate_limit"
+        if isinstance(error, (openai.APIConnectionError, openai.InternalServerError, openai.ConflictError)):
+            return "transient"
+        return super().classify_error(error)
+
+    def get_retry_after(
+        self,
+        error: Exception
+    ):
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
 
     def upload_file_to_model(
         self,
         file_path
     ):
-        file_result = self.client.files.create(
-            file=open(file_path, "rb"), 
-            purpose="assistants"
-        )
+        with open(file_path, "rb") as file:
+            file_result = self.client.files.create(
+                file=file, 
+                purpose="assistants"
+            )
+        return file_result.id
+
+    async def aupload_file(
+        self,
+        file_path
+    ):
+        with open(file_path, "rb") as file:
+            file_result = await self.async_client.files.create(
+                file=file,
+                purpose="assistants"
+            )
         return file_result.id
+
+    def describe_uploaded_file(
+        self,
+        file
+    ) -> dict:
+        # OpenAI keeps uploaded files until they are deleted
+        return {"remote_id": file, "uri": None, "mime_type": None, "expires_at": None}
+
+    def file_from_record(
+        self,
+        record: dict
+    ):
+        return record["remote_id"]
+
+    def delete_uploaded_file(
+        self,
+        remote_id: str
+    ):
+        self.client.files.delete(remote_id)
+
+    def _build_conversation(self, prompt, system_prompt, contents, instructions=None):
+        # Static instructions go first so requests share the longest possible cacheable prefix
+        user_inputs = []
+        if instructions:
+            user_inputs.append({"type": "input_text", "text": instructions})
+        user_inputs.extend({"type": "input_file", "file_id": file_id} for file_id in contents)
+        user_inputs.append({
+            "type": "input_text",
+            "text": prompt
+        })
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_inputs}
+        ]
+
+    def _prompt_cache_key(self, system_prompt, instructions):
+        # Routes requests with the same static prefix to the same cache
+        if not instructions:
+            return NOT_GIVEN
+        return hashlib.sha256(f"{system_prompt}|{instructions}".encode("utf-8")).hexdigest()[:32]
+    
+    def _build_text_format(self, response_schema):
+        if not response_schema:
+            return NOT_GIVEN
+        return {
+            "format": {
+                "type": "json_schema",
+                "name": "structured_output",
+                "schema": response_schema,
+                "strict": True
+            }
+        }
     
     def generate_text(
         self, 
@@ -24,23 +149,153 @@ class OpenAIProvider(GenAIProvider):
         system_prompt:str, 
         temperature: float = 0.5,
         max_tokens: int = 5000,
-        contents: list = []
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
     ) -> str:
-        file_inputs = [{"type": "input_file", "file_id": file_id} for file_id in contents]
-        file_inputs.append({
-            "type": "input_text",
-            "text": prompt
-        })
-        conversation = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": file_inputs}
-        ]
-        
         response = self.client.responses.create(
             model=model,
-            input=conversation,
+            input=self._build_conversation(prompt, system_prompt, contents, instructions),
+            prompt_cache_key=self._prompt_cache_key(system_prompt, instructions),
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            text=self._build_text_format(response_schema),
+            stream=False
+        )
+        return response.output_text
+
+    async def agenerate_text(
+        self, 
+        model: str, 
+        prompt: str, 
+        system_prompt:str, 
+        temperature: float = 0.5,
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ) -> str:
+        response = await self.async_client.responses.create(
+            model=model,
+            input=self._build_conversation(prompt, system_prompt, contents, instructions),
+            prompt_cache_key=self._prompt_cache_key(system_prompt, instructions),
             temperature=temperature,
             max_output_tokens=max_tokens,
+            text=self._build_text_format(response_schema),
             stream=False
         )
         return response.output_text
+
+    def generate_text_stream(
+        self, 
+        model: str, 
+        prompt: str, 
+        system_prompt:str, 
+        temperature: float = 0.5,
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ):
+        stream = self.client.responses.create(
+            model=model,
+            input=self._build_conversation(prompt, system_prompt, contents, instructions),
+            prompt_cache_key=self._prompt_cache_key(system_prompt, instructions),
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            text=self._build_text_format(response_schema),
+            stream=True
+        )
+        for event in stream:
+            if event.type == "response.output_text.delta":
+                yield event.delta
+
+    async def agenerate_text_stream(
+        self, 
+        model: str, 
+        prompt: str, 
+        system_prompt:str, 
+        temperature: float = 0.5,
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ):
+        stream = await self.async_client.responses.create(
+            model=model,
+            input=self._build_conversation(prompt, system_prompt, contents, instructions),
+            prompt_cache_key=self._prompt_cache_key(system_prompt, instructions),
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            text=self._build_text_format(response_schema),
+            stream=True
+        )
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                yield event.delta
+
+    def submit_batch(
+        self,
+        model: str,
+        requests: list
+    ) -> str:
+        lines = []
+        for request in requests:
+            lines.append(json.dumps({
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": "/v1/responses",
+                "body": {
+                    "model": model,
+                    "input": self._build_conversation(request["prompt"], request["system_prompt"], [], request.get("instructions")),
+                    "temperature": request.get("temperature", 0.5),
+                    "max_output_tokens": request.get("max_tokens", 5000),
+                    **({"text": self._build_text_format(request["response_schema"])} if request.get("response_schema") else {})
+                }
+            }))
+        batch_file = self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/responses",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def get_batch_status(
+        self,
+        batch_id: str
+    ) -> str:
+        status = self.client.batches.retrieve(batch_id).status
+        if status == "completed":
+            return "completed"
+        if status in ("failed", "expired", "cancelled"):
+            return "failed"
+        return "running"
+
+    def get_batch_results(
+        self,
+        batch_id: str,
+        custom_ids: list
+    ) -> dict:
+        batch = self.client.batches.retrieve(batch_id)
+        if not batch.output_file_id:
+            return {}
+        results = {}
+        for line in self.client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            results[item["custom_id"]] = "".join(
+                content["text"]
+                for output in response["body"].get("output", [])
+                if output.get("type") == "message"
+                for content in output.get("content", [])
+                if content.get("type") == "output_text"
+            )
+        return results
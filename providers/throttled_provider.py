@@ -0,0 +1,344 @@
+from .base import GenAIProvider
+from contextlib import contextmanager
+import asyncio
+import contextvars
+import random
+import threading
+import time
+
+_retry_limit = contextvars.ContextVar("retry_limit", default=None)
+
+@contextmanager
+def limit_retries(max_retries):
+    """
+    Caps the retries of ThrottledProvider calls made in this block, for callers
+    that would rather fail over to another route than wait. None means no cap.
+    """
+    token = _retry_limit.set(max_retries)
+    try:
+        yield
+    finally:
+        _retry_limit.reset(token)
+
+class ProviderRetryError(Exception):
+    """
+    Raised when a provider call still fails after every retry.
+    """
+
+class TokenBucket:
+    """
+    Allows rate_per_minute units per minute with bursts up to one minute's worth.
+    reserve() takes the units immediately and returns how long the caller has to
+    wait before using them, so callers queue up in order. A rate of 0 disables it.
+    """
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Caps the number of calls in flight with an AIMD rule: the limit grows by one
+    for every full window of successful calls and halves when the provider
+    signals overload, at most once per cooldown so one burst of 429s counts once.
+    """
+    def __init__(self, initial=4, minimum=1, maximum=32, cooldown=2.0):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def _try_acquire(self):
+        if self._in_flight < int(self.limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def acquire(self):
+        with self._condition:
+            while not self._try_acquire():
+                self._condition.wait()
+
+    async def aacquire(self):
+        # Polling keeps waiting tasks off the thread pool and works across event loops
+        delay = 0.01
+        while True:
+            with self._condition:
+                if self._try_acquire():
+                    return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def release(self, outcome):
+        """
+        outcome is "success", "overload" or "error"; only the first two move the limit.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if outcome == "success":
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome == "overload":
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            self._condition.notify_all()
+
+    def metrics(self):
+        with self._condition:
+            return {"concurrency_limit": int(self.limit), "in_flight": self._in_flight}
+
+class ThrottledProvider(GenAIProvider):
+    """
+    Wraps a provider so every generation and upload call goes through shared
+    request and token rate limits and an adaptive concurrency limit, and
+    retries rate limits and transient errors with jittered exponential backoff.
+    limit_retries() lowers the number of retries for calls that can fail over.
+    Every other GenAIProvider method is passed through to the wrapped provider.
+    """
+    def __init__(
+        self,
+        provider: GenAIProvider,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 16,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        self.provider = provider
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=min(4, max_concurrency),
+            maximum=max_concurrency
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def count_tokens(self, model: str, text: str) -> int:
+        return self.provider.count_tokens(model, text)
+
+    def classify_error(self, error: Exception):
+        return self.provider.classify_error(error)
+
+    def get_retry_after(self, error: Exception):
+        return self.provider.get_retry_after(error)
+
+    # GenAIProvider defines these, so __getattr__ would never reach the wrapped provider
+    def describe_uploaded_file(self, file) -> dict:
+        return self.provider.describe_uploaded_file(file)
+
+    def file_from_record(self, record: dict):
+        return self.provider.file_from_record(record)
+
+    def delete_uploaded_file(self, remote_id: str):
+        return self.provider.delete_uploaded_file(remote_id)
+
+    def submit_batch(self, model: str, requests: list) -> str:
+        return self.provider.submit_batch(model, requests)
+
+    def get_batch_status(self, batch_id: str) -> str:
+        return self.provider.get_batch_status(batch_id)
+
+    def get_batch_results(self, batch_id: str, custom_ids: list) -> dict:
+        return self.provider.get_batch_results(batch_id, custom_ids)
+
+    def _request_tokens(self, model, prompt, system_prompt, max_tokens, instructions):
+        # Providers count the requested output against the token limit up front
+        text = "".join(part for part in (system_prompt, instructions, prompt) if isinstance(part, str))
+        return self.provider.count_tokens(model, text) + (max_tokens or 0)
+
+    def _rate_limit_wait(self, tokens):
+        return max(self.request_bucket.reserve(1), self.token_bucket.reserve(tokens))
+
+    def _backoff(self, attempt, error):
+        retry_after = self.provider.get_retry_after(error)
+        if retry_after is not None:
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        # Full jitter keeps clients that failed together from retrying together
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _outcome(self, error, attempt):
+        """
+        Returns (outcome for the concurrency limiter, whether to retry).
+        """
+        max_retries = self.max_retries
+        if _retry_limit.get() is not None:
+            max_retries = min(max_retries, _retry_limit.get())
+        kind = self.provider.classify_error(error)
+        if kind == "rate_limit":
+            return "overload", attempt < max_retries
+        if kind == "transient":
+            return "error", attempt < max_retries
+        return "error", False
+
+    def _call(self, tokens, function, *args):
+        attempt = 0
+        while True:
+            wait = self._rate_limit_wait(tokens)
+            if wait:
+                time.sleep(wait)
+            self.concurrency.acquire()
+            try:
+                result = function(*args)
+            except Exception as e:
+                outcome, retry = self._outcome(e, attempt)
+                self.concurrency.release(outcome)
+                if not retry:
+                    if attempt:
+                        raise ProviderRetryError(f"Giving up after {attempt + 1} attempts: {e}") from e
+                    raise
+                delay = self._backoff(attempt, e)
+                print(f"Provider call failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.concurrency.release("success")
+            return result
+
+    async def _acall(self, tokens, function, *args):
+        attempt = 0
+        while True:
+            wait = self._rate_limit_wait(tokens)
+            if wait:
+                await asyncio.sleep(wait)
+            await self.concurrency.aacquire()
+            try:
+                result = await function(*args)
+            except asyncio.CancelledError:
+                self.concurrency.release("error")
+                raise
+            except Exception as e:
+                outcome, retry = self._outcome(e, attempt)
+                self.concurrency.release(outcome)
+                if not retry:
+                    if attempt:
+                        raise ProviderRetryError(f"Giving up after {attempt + 1} attempts: {e}") from e
+                    raise
+                delay = self._backoff(attempt, e)
+                print(f"Provider call failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.concurrency.release("success")
+            return result
+
+    def upload_file_to_model(self, file_path):
+        return self._call(0, self.provider.upload_file_to_model, file_path)
+
+    async def aupload_file(self, file_path):
+        return await self._acall(0, self.provider.aupload_file, file_path)
+
+    def generate_text(
+        self,
+        model: str,
+        prompt: str,
+        system_prompt: str,
+        temperature: float = 0.5,
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ) -> str:
+        return self._call(
+            self._request_tokens(model, prompt, system_prompt, max_tokens, instructions),
+            self.provider.generate_text,
+            model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions
+        )
+
+    async def agenerate_text(
+        self,
+        model: str,
+        prompt: str,
+        system_prompt: str,
+        temperature: float = 0.5,
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ) -> str:
+        return await self._acall(
+            self._request_tokens(model, prompt, system_prompt, max_tokens, instructions),
+            self.provider.agenerate_text,
+            model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions
+        )
+
+    def generate_text_stream(
+        self,
+        model: str,
+        prompt: str,
+        system_prompt: str,
+        temperature: float = 0.5,
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ):
+        # A stream is retried until its first chunk arrives and counts against the
+        # concurrency limit until then; later errors are raised to the caller
+        tokens = self._request_tokens(model, prompt, system_prompt, max_tokens, instructions)
+        stream = None
+
+        def open_stream():
+            nonlocal stream
+            stream = self.provider.generate_text_stream(
+                model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions
+            )
+            return next(stream, None)
+
+        first_chunk = self._call(tokens, open_stream)
+        if first_chunk is None:
+            return
+        yield first_chunk
+        yield from stream
+
+    async def agenerate_text_stream(
+        self,
+        model: str,
+        prompt: str,
+        system_prompt: str,
+        temperature: float = 0.5,
+        max_tokens: int = 5000,
+        contents: list = [],
+        response_schema: dict = None,
+        instructions: str = None
+    ):
+        tokens = self._request_tokens(model, prompt, system_prompt, max_tokens, instructions)
+        stream = None
+
+        async def open_stream():
+            nonlocal stream
+            stream = self.provider.agenerate_text_stream(
+                model, prompt, system_prompt, temperature, max_tokens, contents, response_schema, instructions
+            )
+            try:
+                return await stream.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        first_chunk = await self._acall(tokens, open_stream)
+        if first_chunk is None:
+            return
+        yield first_chunk
+        async for chunk in stream:
+            yield chunk
@@ -0,0 +1,56 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Provider SDKs that should only be imported once their provider is used
+PROVIDER_MODULES = {
+    "openai": "openai",
+    "gemini": "google.genai"
+}
+
+def measure_imports(module):
+    """
+    Imports module in a fresh interpreter with -X importtime and returns
+    {module name: cumulative microseconds} in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long the app takes to import and check it against a budget.")
+    parser.add_argument("--module", default="app", help="Module to import (default: app)")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", 5000)), help="Maximum import time in milliseconds")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest top-level imports to list")
+    args = parser.parse_args()
+
+    timings = measure_imports(args.module)
+    total_ms = timings.get(args.module, 0) / 1000
+
+    print(f"Importing {args.module} took {total_ms:.0f} ms (budget {args.budget:.0f} ms)")
+    top_level = {name: us for name, us in timings.items() if "." not in name and name != args.module}
+    for name, us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    eager_sdks = [module for module in PROVIDER_MODULES.values() if module in timings]
+    if eager_sdks:
+        print(f"Provider SDKs imported at startup: {', '.join(eager_sdks)}")
+
+    if total_ms > args.budget or eager_sdks:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
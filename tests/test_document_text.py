@@ -0,0 +1,19 @@
+import threading
+
+import document_text
+
+def test_ocr_executor_is_created_once_with_spawn(monkeypatch):
+    monkeypatch.setattr(document_text, "_ocr_executor", None)
+    executors = []
+    threads = [threading.Thread(target=lambda: executors.append(document_text.get_ocr_executor())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    executor = executors[0]
+    try:
+        assert all(other is executor for other in executors)
+        assert executor._mp_context.get_start_method() == "spawn"
+        assert executor.submit(len, "page").result() == 4
+    finally:
+        executor.shutdown()
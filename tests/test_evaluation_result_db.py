@@ -0,0 +1,32 @@
+import pytest
+
+from database.evaluation_result_db import EvaluationResultDB, build_filter_clause
+
+@pytest.fixture
+def db(tmp_path):
+    db = EvaluationResultDB(str(tmp_path / "results.db"))
+    for name in ["Jane_Doe", "jane_smith", "Janet", "Jan%x", "Mary_Jane"]:
+        db.add_result(name, "Evaluation", "2026-01-01_1000", "ACCEPTED")
+    return db
+
+def matching_names(db, name):
+    where, params = build_filter_clause(name=name)
+    with db._connect() as conn:
+        return [row[0] for row in conn.execute(f"SELECT name FROM evaluation_results{where} ORDER BY id", params)]
+
+@pytest.mark.parametrize("name, expected", [
+    ("jane", ["Jane_Doe", "jane_smith", "Janet"]),
+    ("Jane Doe", ["Jane_Doe"]),
+    ("JANE_", ["Jane_Doe", "jane_smith"]),
+    # Wildcards typed into the filter are matched literally
+    ("Jan%", ["Jan%x"]),
+    ("doe", []),
+])
+def test_name_filter_matches_prefix_ignoring_case(db, name, expected):
+    assert matching_names(db, name) == expected
+
+def test_name_filter_uses_index(db):
+    where, params = build_filter_clause(name="jane")
+    with db._connect() as conn:
+        plan = " ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN SELECT id FROM evaluation_results{where}", params))
+    assert "idx_evaluation_results_name_nocase" in plan
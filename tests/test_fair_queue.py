@@ -0,0 +1,62 @@
+import asyncio
+
+from fair_queue import FairQueue
+
+def granted(tickets):
+    return [ticket.granted.is_set() for ticket in tickets]
+
+def test_free_slot_goes_to_user_with_fewest_running():
+    queue = FairQueue(2)
+    alice_1, alice_2 = queue.enter("alice"), queue.enter("alice")
+    # Alice queued her third evaluation before Carol's first
+    alice_3 = queue.enter("alice")
+    carol_1 = queue.enter("carol")
+    assert granted([alice_1, alice_2, alice_3, carol_1]) == [True, True, False, False]
+
+    alice_1.release()
+    assert granted([alice_3, carol_1]) == [False, True]
+    alice_2.release()
+    assert alice_3.granted.is_set()
+
+def test_one_user_cannot_starve_another():
+    queue = FairQueue(1)
+    alice = [queue.enter("alice") for _ in range(3)]
+    bob = queue.enter("bob")
+
+    alice[0].release()
+    assert granted(alice[1:] + [bob]) == [False, False, True]
+    bob.release()
+    assert granted(alice[1:]) == [True, False]
+
+def test_position_follows_dispatch_order():
+    queue = FairQueue(1)
+    alice = [queue.enter("alice") for _ in range(3)]
+    bob = queue.enter("bob")
+    assert [ticket.position() for ticket in alice + [bob]] == [0, 1, 2, 0]
+
+def test_releasing_waiting_ticket_withdraws_it():
+    queue = FairQueue(1)
+    running = queue.enter("alice")
+    cancelled = queue.enter("bob")
+    waiting = queue.enter("carol")
+    assert waiting.position() == 1
+
+    cancelled.release()
+    assert waiting.position() == 0
+    assert queue.metrics() == {"limit": 1, "active": 1, "waiting": 1, "waiting_users": 1}
+
+    running.release()
+    assert waiting.granted.is_set()
+    assert not cancelled.granted.is_set()
+    assert queue.metrics()["active"] == 1
+
+def test_wait_returns_whether_slot_was_granted():
+    async def run():
+        queue = FairQueue(1)
+        running = queue.enter("alice")
+        waiting = queue.enter("bob")
+        timed_out = await waiting.wait(0.05)
+        asyncio.get_running_loop().call_later(0.05, running.release)
+        return timed_out, await waiting.wait(1)
+
+    assert asyncio.run(run()) == (False, True)
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from providers.model_router import ModelRouter
+
+@pytest.mark.parametrize("hedged_tasks, task, expected", [
+    (["evaluate"], "evaluate", True),
+    (["evaluate"], "decision", False),
+    (["parse"], "parse_essay", True),
+    (["parse"], "parse_vpd", True),
+    (["parse_transcript"], "parse_transcript", True),
+    (["parse_transcript"], "parse_essay", False),
+    ([], "parse_essay", False),
+])
+def test_hedged_tasks(hedged_tasks, task, expected):
+    router = ModelRouter({}, {"default": []}, files_provider="openai", hedged_tasks=hedged_tasks)
+    assert router._is_hedged(task) is expected
+
+class FakeProvider:
+    """
+    Answers after delay seconds, or after gate is set, or raises when failing.
+    """
+    def __init__(self, name, calls, delay=0.0, fail=False, gate=None):
+        self.name = name
+        self.calls = calls
+        self.delay = delay
+        self.fail = fail
+        self.gate = gate
+        self.streams = []
+        self.closed = False
+
+    async def _wait(self):
+        self.calls.append(self.name)
+        if self.gate is not None:
+            await self.gate.wait()
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+
+    async def agenerate_text(self, model, *args):
+        await self._wait()
+        return self.name
+
+    def agenerate_text_stream(self, model, *args):
+        async def stream():
+            try:
+                await self._wait()
+                yield f"{self.name}-1"
+                yield f"{self.name}-2"
+            finally:
+                self.closed = True
+        # Kept so a stream nobody closes isn't finalized by the garbage collector
+        self.streams.append(stream())
+        return self.streams[-1]
+
+def hedged_router(providers):
+    router = ModelRouter(
+        providers,
+        {"default": [(name, "model") for name in providers]},
+        files_provider="a",
+        hedged_tasks=["evaluate"]
+    )
+    # Ten fast calls make the first route's p95 a few milliseconds
+    for _ in range(10):
+        router.routes_for("evaluate")[0].stats.record_success(0.005)
+    return router
+
+def test_failover_skips_route_used_by_hedge():
+    calls = []
+    router = hedged_router({
+        "a": FakeProvider("a", calls, delay=0.05, fail=True),
+        "b": FakeProvider("b", calls, fail=True),
+        "c": FakeProvider("c", calls)
+    })
+    assert asyncio.run(router.agenerate_text("evaluate", "prompt", "system")) == "c"
+    assert calls == ["a", "b", "c"]
+
+def test_hedged_stream_closes_loser_finished_in_same_round():
+    async def run():
+        gate = asyncio.Event()
+        calls = []
+        providers = {"a": FakeProvider("a", calls, gate=gate), "b": FakeProvider("b", calls, gate=gate)}
+        router = hedged_router(providers)
+        # Opens the gate once both routes are waiting on it, so both streams answer together
+        asyncio.get_running_loop().call_later(0.05, gate.set)
+        chunks = [chunk async for chunk in router.agenerate_text_stream("evaluate", "prompt", "system")]
+        return chunks, calls, providers["b"].closed
+
+    chunks, calls, loser_closed = asyncio.run(run())
+    assert calls == ["a", "b"]
+    assert chunks == ["a-1", "a-2"]
+    assert loser_closed
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from helpers import parse_applicant_name, parse_decision, resolve_structured_evaluation, sanitize_applicant_name
+
+@pytest.mark.parametrize("summary, expected", [
+    ("Final Decision: ACCEPTED", "ACCEPTED"),
+    ("**Decision:** REJECTED", "REJECTED"),
+    ("decision - accepted", "ACCEPTED"),
+    # The last stated decision wins over an earlier draft
+    ("Decision: REJECTED\nOn review.\nFinal decision: ACCEPTED", "ACCEPTED"),
+    ("Decision: ACCEPTED (not REJECTED)", "ACCEPTED"),
+    ("Strong candidate overall. ACCEPTED", "ACCEPTED"),
+    ("The applicant should not be ACCEPTED.", None),
+    ("Decision: NOT ACCEPTED", None),
+    ("ACCEPTED students usually score higher than REJECTED ones.", None),
+    ("The applicant was accepted.", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_decision(summary, expected):
+    assert parse_decision(summary) == expected
+
+@pytest.mark.parametrize("transcript, expected", [
+    ("Name: Jane Doe", "Jane_Doe"),
+    ("**Name:** Jane Doe", "Jane_Doe"),
+    ("# Name: José García", "José_García"),
+    ("GPA 3.9\nname: jane doe\nYear 2", "jane_doe"),
+    ("- Name : NO_NAME_FOUND", None),
+    ("Name: 12345", None),
+    ("Name:   ", None),
+    ("Student Name: Jane Doe", None),
+    ("Name: " + "A" * 120, None),
+    ("GPA 3.9", None),
+    (None, None),
+])
+def test_parse_applicant_name(transcript, expected):
+    assert parse_applicant_name(transcript) == expected
+
+@pytest.mark.parametrize("answer, expected", [
+    ("Jane Doe", "Jane_Doe"),
+    ("  Jane-Marie  O'Neil\nExplanation", "Jane_Marie_ONeil"),
+    ("NO_NAME_FOUND", "Unknown_Applicant"),
+    ("NO_NAME_FOUND.", "Unknown_Applicant"),
+    ("", "Unknown_Applicant"),
+    (None, "Unknown_Applicant"),
+])
+def test_sanitize_applicant_name(answer, expected):
+    assert sanitize_applicant_name(answer) == expected
+
+@pytest.mark.parametrize("applicant_name", ["NO_NAME_FOUND", "", "Unknown_Applicant"])
+def test_structured_evaluation_without_name_reads_transcript(applicant_name):
+    raw_output = json.dumps({"applicant_name": applicant_name, "decision": "accepted", "markdown": "# x"})
+    assert resolve_structured_evaluation(raw_output, "Name : Jane Doe") == ("# x", "Jane_Doe", "ACCEPTED")
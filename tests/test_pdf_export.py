@@ -0,0 +1,25 @@
+import os
+import zipfile
+
+import pdf_export
+
+MARKDOWN = "# Evaluation\n\n**Decision:** ACCEPTED"
+
+def test_render_cached_pdf_renders_missing_file(tmp_path):
+    path = str(tmp_path / "entry" / "Ada_Evaluation.pdf")
+    content = pdf_export.render_cached_pdf(MARKDOWN, path)
+    assert content.startswith(b"%PDF")
+    assert os.path.exists(path)
+    # Evicted between export runs: rendered again instead of failing
+    os.remove(path)
+    assert pdf_export.render_cached_pdf(MARKDOWN, path).startswith(b"%PDF")
+
+def test_export_pdfs_zip(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_export, "pdf_cache", pdf_export.PDFCache(str(tmp_path / "cache"), 0))
+    evaluations = [
+        ("Ada", "Ada_Evaluation.pdf", MARKDOWN),
+        ("Bob", "Bob_Evaluation.pdf", MARKDOWN.replace("ACCEPTED", "REJECTED"))
+    ]
+    output_path = pdf_export.export_pdfs(evaluations, str(tmp_path / "cohort.zip"), workers=1)
+    with zipfile.ZipFile(output_path) as archive:
+        assert archive.namelist() == ["1_Ada_Evaluation.pdf", "2_Bob_Evaluation.pdf"]
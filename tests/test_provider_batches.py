@@ -0,0 +1,153 @@
+import json
+
+import pytest
+
+import batch_evaluation
+from database.evaluation_result_db import EvaluationResultDB
+from providers.base import GenAIProvider
+
+def structured_output(name, decision="ACCEPTED"):
+    return json.dumps({"applicant_name": name, "decision": decision, "markdown": f"# Evaluation of {name}"})
+
+class FakeBatchProvider(GenAIProvider):
+    """
+    Keeps submitted batches in memory; tests set their status and results.
+    """
+    def __init__(self):
+        self.batches = {}
+        self.broken = set()
+
+    def submit_batch(self, model, requests):
+        batch_id = f"batch-{len(self.batches) + 1}"
+        self.batches[batch_id] = {"status": "running", "requests": requests, "results": {}}
+        return batch_id
+
+    def get_batch_status(self, batch_id):
+        return self.batches[batch_id]["status"]
+
+    def get_batch_results(self, batch_id, custom_ids):
+        if batch_id in self.broken:
+            raise RuntimeError("results file unavailable")
+        return {custom_id: self.batches[batch_id]["results"].get(custom_id) for custom_id in custom_ids}
+
+    def finish(self, batch_id, outputs):
+        """
+        Completes a batch with outputs in request order.
+        """
+        batch = self.batches[batch_id]
+        batch["status"] = "completed"
+        for request, output in zip(batch["requests"], outputs):
+            batch["results"][request["custom_id"]] = output
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    provider = FakeBatchProvider()
+    db = EvaluationResultDB(str(tmp_path / "results.db"))
+    transcripts = {"ada": "Name: Ada Lovelace\nGPA 4.0", "bob": "GPA 3.1"}
+    monkeypatch.setattr(batch_evaluation, "db", db)
+    monkeypatch.setattr(batch_evaluation, "providers", {"fake": provider})
+    monkeypatch.setattr(batch_evaluation, "get_task_route", lambda task: ("fake", "fake-model"))
+    monkeypatch.setattr(
+        batch_evaluation, "parse_bundle",
+        lambda files: {"essay": "Essay", "transcript": transcripts[files["key"]], "vpd": ""}
+    )
+    monkeypatch.setattr(
+        batch_evaluation, "find_applicant_bundles", lambda root: {key: {"key": key} for key in transcripts}
+    )
+    monkeypatch.setattr(
+        batch_evaluation, "build_evaluation_request",
+        lambda essay, transcript, vpd, structured=False: {"message": transcript, "instructions": None, "max_tokens": 100}
+    )
+    # Collecting a batch must not call the model
+    monkeypatch.setattr(batch_evaluation, "get_decision", lambda summary: pytest.fail("get_decision was called"))
+    provider.db = db
+    provider.source = str(tmp_path)
+    return provider
+
+def submit(fake):
+    job_id = batch_evaluation.submit_provider_batch(fake.source, concurrency=1)
+    return job_id, list(fake.batches)[-1]
+
+def test_submit_requests_one_structured_evaluation_per_applicant(fake):
+    job_id, batch_id = submit(fake)
+    requests = fake.batches[batch_id]["requests"]
+    assert [request["custom_id"] for request in requests] == ["applicant-0-evaluation", "applicant-1-evaluation"]
+    assert all(request["response_schema"] == batch_evaluation.EVALUATION_SCHEMA for request in requests)
+    assert fake.db.get_batch_item_statuses(job_id) == {"ada": "submitted", "bob": "submitted"}
+
+def test_running_batch_is_left_alone(fake):
+    job_id, _ = submit(fake)
+    assert batch_evaluation.collect_provider_batches() == 1
+    assert fake.db.get_batch_item_statuses(job_id) == {"ada": "submitted", "bob": "submitted"}
+    assert fake.db.get_batch_job(job_id)[3] == "running"
+
+def test_completed_batch_stores_evaluations(fake):
+    job_id, batch_id = submit(fake)
+    # Ada's name comes from her transcript when the model doesn't give one
+    fake.finish(batch_id, [structured_output("NO_NAME_FOUND"), structured_output("Bob Builder", "REJECTED")])
+
+    assert batch_evaluation.collect_provider_batches() == 0
+    assert fake.db.get_batch_item_statuses(job_id) == {"ada": "done", "bob": "done"}
+    assert fake.db.get_running_provider_batches() == []
+    stored = fake.db.get_dataframe()
+    assert list(stored["Applicant Name"]) == ["Ada_Lovelace", "Bob_Builder"]
+    assert list(stored["Decision"]) == ["ACCEPTED", "REJECTED"]
+    assert fake.db.get_markdown(int(stored["ID"][1])) == "# Evaluation of Bob Builder"
+    # A second collect finds nothing left to store
+    assert batch_evaluation.collect_provider_batches() == 0
+    assert len(fake.db.get_dataframe()) == 2
+
+def test_plain_evaluation_without_clear_decision_fails_its_applicant(fake):
+    job_id, batch_id = submit(fake)
+    fake.finish(batch_id, ["Strong grades.\n\n**Decision:** ACCEPTED", "The committee should discuss this applicant."])
+
+    assert batch_evaluation.collect_provider_batches() == 0
+    assert fake.db.get_batch_item_statuses(job_id) == {"ada": "done", "bob": "failed"}
+    assert fake.db.get_batch_job(job_id)[3] == "completed_with_errors"
+
+def test_failed_batch_marks_its_applicants_failed(fake):
+    job_id, batch_id = submit(fake)
+    fake.batches[batch_id]["status"] = "failed"
+
+    assert batch_evaluation.collect_provider_batches() == 0
+    assert fake.db.get_batch_item_statuses(job_id) == {"ada": "failed", "bob": "failed"}
+    assert fake.db.get_running_provider_batches() == []
+    assert fake.db.get_batch_job(job_id)[3] == "completed_with_errors"
+
+def test_error_in_one_batch_does_not_stop_the_others(fake):
+    first_job, first_batch = submit(fake)
+    second_job, second_batch = submit(fake)
+    fake.finish(first_batch, [structured_output("Ada Lovelace"), structured_output("Bob Builder")])
+    fake.finish(second_batch, [structured_output("Ada Lovelace"), structured_output("Bob Builder")])
+    fake.broken.add(first_batch)
+
+    assert batch_evaluation.collect_provider_batches() == 1
+    # Nothing of the failed batch was stored and it is collected again later
+    assert fake.db.get_batch_item_statuses(first_job) == {"ada": "submitted", "bob": "submitted"}
+    assert fake.db.get_batch_item_statuses(second_job) == {"ada": "done", "bob": "done"}
+    assert len(fake.db.get_dataframe()) == 2
+
+    fake.broken.clear()
+    assert batch_evaluation.collect_provider_batches() == 0
+    assert fake.db.get_batch_item_statuses(first_job) == {"ada": "done", "bob": "done"}
+    assert len(fake.db.get_dataframe()) == 4
+
+def test_save_error_leaves_batch_running(fake, monkeypatch):
+    job_id, batch_id = submit(fake)
+    fake.finish(batch_id, [structured_output("Ada Lovelace"), structured_output("Bob Builder")])
+
+    real_insert = fake.db._insert_result
+    calls = []
+
+    def insert_result(conn, *row):
+        calls.append(row)
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        return real_insert(conn, *row)
+
+    monkeypatch.setattr(fake.db, "_insert_result", insert_result)
+    assert batch_evaluation.collect_provider_batches() == 1
+    # The first applicant's insert was rolled back with the rest of the batch
+    assert len(fake.db.get_dataframe()) == 0
+    assert fake.db.get_batch_item_statuses(job_id) == {"ada": "submitted", "bob": "submitted"}
+    assert len(fake.db.get_running_provider_batches()) == 1
@@ -0,0 +1,116 @@
+import asyncio
+import inspect
+
+import pytest
+
+from providers.base import GenAIProvider
+from providers.model_router import ModelRouter
+from providers.throttled_provider import ThrottledProvider, limit_retries
+
+class RecordingProvider(GenAIProvider):
+    """
+    Implements every GenAIProvider method by recording the call.
+    """
+    def __init__(self):
+        self.calls = []
+
+def _recorder(name):
+    def method(self, *args, **kwargs):
+        self.calls.append(name)
+        return name
+    return method
+
+PASSTHROUGH_METHODS = [
+    "describe_uploaded_file",
+    "file_from_record",
+    "delete_uploaded_file",
+    "submit_batch",
+    "get_batch_status",
+    "get_batch_results",
+    "count_tokens",
+    "classify_error",
+    "get_retry_after"
+]
+for _name in PASSTHROUGH_METHODS:
+    setattr(RecordingProvider, _name, _recorder(_name))
+
+@pytest.mark.parametrize("name", PASSTHROUGH_METHODS)
+def test_method_reaches_wrapped_provider(name):
+    provider = RecordingProvider()
+    throttled = ThrottledProvider(provider)
+    arguments = [None] * (len(inspect.signature(getattr(GenAIProvider, name)).parameters) - 1)
+    assert getattr(throttled, name)(*arguments) == name
+    assert name in provider.calls
+
+def test_every_sync_base_method_is_overridden_or_delegated():
+    # A base stub shadowing __getattr__ would raise NotImplementedError through the wrapper
+    for name, member in inspect.getmembers(GenAIProvider, inspect.isfunction):
+        if name.startswith("_"):
+            continue
+        if "NotImplementedError" in inspect.getsource(member):
+            assert name in vars(ThrottledProvider), f"ThrottledProvider does not forward {name}()"
+
+class RateLimitedProvider(GenAIProvider):
+    """
+    Fails every call with a rate limit, or only the first `failures` calls.
+    """
+    def __init__(self, name, failures=None):
+        self.name = name
+        self.failures = failures
+        self.calls = 0
+
+    def count_tokens(self, model, text):
+        return 0
+
+    def classify_error(self, error):
+        return "rate_limit"
+
+    def get_retry_after(self, error):
+        return None
+
+    def _answer(self):
+        self.calls += 1
+        if self.failures is None or self.calls <= self.failures:
+            raise RuntimeError("429 Too Many Requests")
+        return self.name
+
+    def generate_text(self, model, *args):
+        return self._answer()
+
+    async def agenerate_text(self, model, *args):
+        return self._answer()
+
+def throttled(provider):
+    return ThrottledProvider(provider, max_retries=3, base_delay=0.001)
+
+def test_retries_until_success():
+    provider = RateLimitedProvider("a", failures=2)
+    assert throttled(provider).generate_text("model", "prompt", "system") == "a"
+    assert provider.calls == 3
+
+def test_limit_retries_caps_retries():
+    provider = RateLimitedProvider("a", failures=2)
+    with limit_retries(0):
+        with pytest.raises(RuntimeError):
+            throttled(provider).generate_text("model", "prompt", "system")
+    assert provider.calls == 1
+
+def router_with(primary, fallback):
+    return ModelRouter(
+        {"a": throttled(primary), "b": throttled(fallback)},
+        {"default": [("a", "model"), ("b", "model")]},
+        files_provider="a"
+    )
+
+def test_rate_limited_route_fails_over_without_retrying():
+    primary, fallback = RateLimitedProvider("a"), RateLimitedProvider("b", failures=1)
+    router = router_with(primary, fallback)
+    assert router.generate_text("evaluate", "prompt", "system") == "b"
+    # The last route still gets its retries
+    assert (primary.calls, fallback.calls) == (1, 2)
+
+def test_rate_limited_route_fails_over_without_retrying_async():
+    primary, fallback = RateLimitedProvider("a"), RateLimitedProvider("b", failures=1)
+    router = router_with(primary, fallback)
+    assert asyncio.run(router.agenerate_text("evaluate", "prompt", "system")) == "b"
+    assert (primary.calls, fallback.calls) == (1, 2)
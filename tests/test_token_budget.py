@@ -0,0 +1,42 @@
+import pytest
+
+import helpers
+from token_budget import choose_output_tokens, get_context_window
+
+@pytest.mark.parametrize("model, expected", [
+    ("gpt-4", 8192),
+    ("gpt-4-0613", 8192),
+    ("gpt-4-turbo-2024-04-09", 128000),
+    ("gpt-4o-mini", 128000),
+    ("gpt-4.1-nano", 1047576),
+    ("gemini-2.5-flash", 1048576),
+    ("some-local-model", 128000),
+])
+def test_get_context_window(model, expected):
+    assert get_context_window(model) == expected
+
+@pytest.mark.parametrize("input_tokens, context_window, expected", [
+    (30000, 128000, 6000),
+    (5000, 8192, 3192),
+    (7800, 8192, 1000),
+])
+def test_choose_output_tokens(input_tokens, context_window, expected):
+    assert choose_output_tokens(input_tokens, context_window, 6000) == expected
+
+def build_request(monkeypatch, routes, essay):
+    monkeypatch.setattr(helpers, "MODEL_CONTEXT_WINDOW", 0)
+    monkeypatch.setattr(helpers, "model_routes", routes)
+    monkeypatch.setattr(helpers, "count_tokens", lambda text: len((text or "").split()))
+    return helpers.build_evaluation_request(essay, "Transcript", "")
+
+def test_large_window_keeps_full_output(monkeypatch):
+    request = build_request(monkeypatch, {"default": [("openai", "gpt-4.1")]}, "word " * 5000)
+    assert request["max_tokens"] == helpers.MAX_OUTPUT_TOKENS
+
+def test_small_window_of_any_evaluate_route_shrinks_input_and_output(monkeypatch):
+    routes = {"default": [("openai", "gpt-4.1")], "evaluate": [("openai", "gpt-4.1"), ("openai", "gpt-4")]}
+    request = build_request(monkeypatch, routes, "word " * 20000)
+    input_tokens = sum(len(text.split()) for text in (helpers.EVALUATION_SYSTEM_PROMPT, request["instructions"], request["message"]))
+    assert input_tokens <= 8192 - 1000
+    assert 1000 <= request["max_tokens"] < helpers.MAX_OUTPUT_TOKENS
+    assert input_tokens + request["max_tokens"] <= 8192
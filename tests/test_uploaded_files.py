@@ -0,0 +1,56 @@
+import threading
+import time
+
+import helpers
+from database.uploaded_file_db import UploadedFileDB
+
+FILE_HASH = "ab" * 32
+
+def test_replaced_upload_is_swept_when_it_expires(tmp_path):
+    db = UploadedFileDB(str(tmp_path / "parse_cache.db"))
+    db.put(FILE_HASH, "openai", "file-old", None, "application/pdf", time.time() - 1)
+    db.put(FILE_HASH, "openai", "file-new", None, "application/pdf", time.time() + 3600)
+
+    assert db.get(FILE_HASH, "openai")["remote_id"] == "file-new"
+    assert db.get_expired("openai") == ["file-old"]
+    db.delete("file-old", "openai")
+    assert db.get_expired("openai") == []
+    assert db.get(FILE_HASH, "openai")["remote_id"] == "file-new"
+
+def test_storing_the_same_upload_again_retires_nothing(tmp_path):
+    db = UploadedFileDB(str(tmp_path / "parse_cache.db"))
+    db.put(FILE_HASH, "openai", "file-1", None, "application/pdf", time.time() - 1)
+    db.put(FILE_HASH, "openai", "file-1", None, "application/pdf", time.time() - 1)
+    assert db.get_expired("openai") == ["file-1"]
+
+class SlowUploadProvider:
+    def __init__(self):
+        self.uploads = 0
+
+    def upload_file_to_model(self, file_path):
+        self.uploads += 1
+        time.sleep(0.05)
+        return f"file-{self.uploads}"
+
+    def describe_uploaded_file(self, file):
+        return {"remote_id": file, "uri": None, "mime_type": "application/pdf", "expires_at": None}
+
+    def file_from_record(self, record):
+        return record["remote_id"]
+
+def test_concurrent_parses_upload_a_file_once(tmp_path, monkeypatch):
+    fake = SlowUploadProvider()
+    monkeypatch.setattr(helpers, "ACTIVE_PROVIDER", "openai")
+    monkeypatch.setattr(helpers, "provider", fake)
+    monkeypatch.setattr(helpers, "uploaded_files", UploadedFileDB(str(tmp_path / "parse_cache.db")))
+    files = []
+    threads = [
+        threading.Thread(target=lambda: files.append(helpers.upload_file_once("essay.pdf", FILE_HASH)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fake.uploads == 1
+    assert files == ["file-1"] * 4
@@ -0,0 +1,97 @@
+import re
+
+TRUNCATION_MARKER = "\n[... shortened to fit the input budget ...]\n"
+MIN_OUTPUT_TOKENS = 1000
+
+# Context windows of common models by name prefix; the longest matching prefix wins
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-5": 400000,
+    "o1": 200000,
+    "o3": 200000,
+    "o4-mini": 200000,
+    "gemini-1.5": 1048576,
+    "gemini-2": 1048576,
+}
+DEFAULT_CONTEXT_WINDOW = 128000
+
+def compact_text(text):
+    """
+    Rewrites parsed document text into a denser form with the same content:
+    Markdown table cells lose their alignment padding, separator rows shrink to a
+    minimal |-|-| and runs of spaces and blank lines collapse.
+    """
+    lines = []
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if line.startswith("|"):
+            cells = [cell.strip() for cell in line.strip("|").split("|")]
+            if all(re.fullmatch(r":?-+:?", cell) for cell in cells if cell):
+                cells = ["-" for _ in cells]
+            line = "|" + "|".join(cells) + "|"
+        else:
+            line = re.sub(r"[ \t]+", " ", line)
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+def truncate_to_tokens(text, max_tokens, count_tokens):
+    """
+    Shortens text to about max_tokens by cutting from the end at a line break.
+    """
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    # The marker counts against the budget too
+    max_tokens -= count_tokens(TRUNCATION_MARKER)
+    if max_tokens <= 0:
+        return TRUNCATION_MARKER.strip()
+    cut = text[:int(len(text) * max_tokens / tokens)]
+    if "\n" in cut[len(cut) // 2:]:
+        cut = cut[:cut.rindex("\n")]
+    return cut + TRUNCATION_MARKER
+
+def fit_sections(sections, budget, count_tokens):
+    """
+    Compacts every section and, if they still exceed the token budget together,
+    shortens the largest ones until they fit. Short sections are never cut for
+    the benefit of long ones. Returns (sections, token counts per section).
+    """
+    sections = {name: compact_text(text) for name, text in sections.items()}
+    counts = {name: count_tokens(text) for name, text in sections.items()}
+    if sum(counts.values()) <= budget:
+        return sections, counts
+
+    # Water-filling: each section keeps min(its size, a shared cap) tokens
+    remaining = max(budget, 0)
+    cap = 0
+    for index, (name, tokens) in enumerate(sorted(counts.items(), key=lambda item: item[1])):
+        cap = remaining // (len(counts) - index)
+        if tokens > cap:
+            break
+        remaining -= tokens
+    for name, tokens in counts.items():
+        if tokens > cap:
+            sections[name] = truncate_to_tokens(sections[name], cap, count_tokens)
+            counts[name] = count_tokens(sections[name])
+    return sections, counts
+
+def get_context_window(model):
+    """
+    Context window of a model from CONTEXT_WINDOWS, or DEFAULT_CONTEXT_WINDOW for
+    models it doesn't list.
+    """
+    prefixes = [prefix for prefix in CONTEXT_WINDOWS if (model or "").startswith(prefix)]
+    return CONTEXT_WINDOWS[max(prefixes, key=len)] if prefixes else DEFAULT_CONTEXT_WINDOW
+
+def choose_output_tokens(input_tokens, context_window, max_output_tokens, min_output_tokens=MIN_OUTPUT_TOKENS):
+    """
+    Output limit for a request: max_output_tokens unless the context window
+    can't hold that much next to the input, but never below min_output_tokens.
+    """
+    return max(min_output_tokens, min(max_output_tokens, context_window - input_tokens))